@@ -0,0 +1,233 @@
+import os
+import io
+import csv
+import time
+from rollover import session_date
+
+INTERVALS = {"1s": 1, "1m": 60, "5m": 300}
+BAR_HEADER = ["symbol", "interval", "start", "open", "high", "low", "close", "volume", "vwap", "ticks"]
+
+
+def bar_filename(interval, date):
+    return f"bars_{interval}_{date}.csv"
+
+
+def merge_bars(filename, rows):
+    """Merge bar rows (e.g. backfilled candles) into a bar CSV in start order.
+
+    A merged row replaces any bar already there for the same symbol and start.
+    The file is rewritten under a temporary name and renamed into place, so it
+    must not be open for appending elsewhere; see BarCsvSink.merge.
+    """
+    replaced = {(row[0], int(row[2])) for row in rows}
+    kept = []
+    if os.path.exists(filename):
+        with open(filename, newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            kept = [row for row in reader if row and (row[0], int(float(row[2]))) not in replaced]
+    merged = sorted(kept + [list(row) for row in rows], key=lambda row: int(float(row[2])))
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(BAR_HEADER)
+        writer.writerows(merged)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, filename)
+
+
+class Bar:
+    __slots__ = ("start", "open", "high", "low", "close", "volume", "turnover", "ticks")
+
+    def __init__(self, start, price):
+        self.start = start
+        self.open = self.high = self.low = self.close = price
+        self.volume = 0
+        self.turnover = 0.0
+        self.ticks = 0
+
+    def add(self, price, volume):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += volume
+        self.turnover += price * volume
+        self.ticks += 1
+
+    def vwap(self):
+        return self.turnover / self.volume if self.volume else self.close
+
+
+class SymbolBars:
+    __slots__ = ("cum_volume", "bars", "closed_until", "carry_volume", "carry_turnover")
+
+    def __init__(self, intervals):
+        self.cum_volume = None
+        self.bars = [None] * intervals
+        # End of the last bar emitted per interval; ticks before it are late.
+        self.closed_until = [0] * intervals
+        # Volume of late ticks that arrived while no bar was open, for the next bar to take.
+        self.carry_volume = [0] * intervals
+        self.carry_turnover = [0.0] * intervals
+
+
+class BarAggregator:
+    """Rolls ticks into per-symbol OHLCV/VWAP bars for each interval in O(1) per tick.
+
+    Bar time comes from exch_feed_time (falling back to last_traded_time), and
+    bar volume is the increase in the cumulative vol_traded_today. A bar is
+    emitted when a tick for a later bucket arrives or, for quiet symbols, once
+    the feed clock is ``grace`` seconds past its end. The feed clock is the
+    latest exch_feed_time seen, advanced by the wall clock only while no newer
+    one arrives, so a lagging feed or a host clock that runs ahead cannot close
+    a bar before its own ticks are in. Bars are never reopened or moved back:
+    a tick older than the open bar (or than the last emitted one) has its price
+    dropped but its traded volume added to the open bar, or to the next bar to
+    open, so the bar volumes add up to the growth of vol_traded_today. A replay
+    after a reconnect adds no volume because the cumulative counter does not
+    increase.
+    """
+
+    def __init__(self, sink, intervals=("1s", "1m", "5m"), grace=2):
+        self.sink = sink
+        self.names = list(intervals)
+        self.seconds = [INTERVALS[name] for name in self.names]
+        self.grace = grace
+        self.symbols = {}
+        self.late = 0
+        # Latest feed time over all symbols, and the (feed time, monotonic time) close_idle last advanced from.
+        self.feed_time = 0
+        self.anchor = (0, time.monotonic())
+
+    def update(self, tick):
+        ts = tick.exch_feed_time or tick.last_traded_time
+        price = tick.ltp
+        if ts is None or price is None:
+            return
+        if ts > self.feed_time:
+            self.feed_time = ts
+        state = self.symbols.get(tick.symbol)
+        if state is None:
+            state = self.symbols[tick.symbol] = SymbolBars(len(self.seconds))
+        volume = 0
+        cum_volume = tick.vol_traded_today
+        if cum_volume is not None:
+            if state.cum_volume is not None and cum_volume > state.cum_volume:
+                volume = cum_volume - state.cum_volume
+            if state.cum_volume is None or cum_volume > state.cum_volume:
+                state.cum_volume = cum_volume
+        bars = state.bars
+        for i, seconds in enumerate(self.seconds):
+            start = ts - ts % seconds
+            bar = bars[i]
+            if bar is not None and start > bar.start:
+                self.emit(tick.symbol, i, bar, state)
+                bar = None
+            if start < (state.closed_until[i] if bar is None else bar.start):
+                # Out-of-order tick: keep its traded volume, leave the prices alone.
+                self.late += 1
+                if bar is None:
+                    state.carry_volume[i] += volume
+                    state.carry_turnover[i] += price * volume
+                else:
+                    bar.volume += volume
+                    bar.turnover += price * volume
+                continue
+            if bar is None:
+                bar = bars[i] = Bar(start, price)
+                if state.carry_volume[i]:
+                    bar.volume = state.carry_volume[i]
+                    bar.turnover = state.carry_turnover[i]
+                    state.carry_volume[i] = 0
+                    state.carry_turnover[i] = 0.0
+            bar.add(price, volume)
+
+    def emit(self, symbol, i, bar, state):
+        state.bars[i] = None
+        state.closed_until[i] = bar.start + self.seconds[i]
+        self.sink.write(symbol, self.names[i], bar)
+
+    def feed_clock(self):
+        """Feed time now: the latest exch_feed_time, plus the wall time elapsed since it last moved."""
+        monotonic = time.monotonic()
+        if self.feed_time > self.anchor[0]:
+            self.anchor = (self.feed_time, monotonic)
+            return self.feed_time
+        return self.anchor[0] + (monotonic - self.anchor[1])
+
+    def close_idle(self, now=None):
+        """Emit bars whose interval ended more than ``grace`` seconds ago on the feed clock."""
+        now = self.feed_clock() if now is None else now
+        for symbol, state in self.symbols.items():
+            for i, bar in enumerate(state.bars):
+                if bar is not None and bar.start + self.seconds[i] + self.grace <= now:
+                    self.emit(symbol, i, bar, state)
+        self.sink.flush()
+
+    def close_all(self):
+        for symbol, state in self.symbols.items():
+            for i, bar in enumerate(state.bars):
+                if bar is not None:
+                    self.emit(symbol, i, bar, state)
+        self.sink.close()
+
+
+class BarCsvSink:
+    """Appends closed bars to bars_<interval>_<date>.csv, one buffered file per interval."""
+
+    def __init__(self, intervals=("1s", "1m", "5m"), date=None):
+        self.intervals = intervals
+        self.files = {}
+        self.buffers = {}
+        self.writers = {}
+        # (interval, symbol, start) of merged bars; a live bar for one of them arriving later is not written.
+        self.merged = set()
+        self.open_files(date or session_date())
+
+    def open_files(self, date):
+        self.date = date
+        for name in self.intervals:
+            filename = bar_filename(name, date)
+            is_new = not os.path.exists(filename)
+            self.files[name] = open(filename, 'a', newline='')
+            if is_new:
+                csv.writer(self.files[name]).writerow(BAR_HEADER)
+            self.buffers[name] = io.StringIO()
+            self.writers[name] = csv.writer(self.buffers[name])
+
+    def write(self, symbol, interval, bar):
+        if self.merged and (interval, symbol, bar.start) in self.merged:
+            return
+        self.writers[interval].writerow([symbol, interval, bar.start, bar.open, bar.high, bar.low, bar.close,
+                                         bar.volume, round(bar.vwap(), 4), bar.ticks])
+
+    def flush(self):
+        for name, buffer in self.buffers.items():
+            if buffer.tell():
+                self.files[name].write(buffer.getvalue())
+                self.files[name].flush()
+                buffer.seek(0)
+                buffer.truncate()
+
+    def close(self):
+        self.flush()
+        for file in self.files.values():
+            file.close()
+
+    def merge(self, interval, rows):
+        """Merge rows into this sink's own file for ``interval``, reopening it afterwards."""
+        self.flush()
+        self.files[interval].close()
+        filename = bar_filename(interval, self.date)
+        merge_bars(filename, rows)
+        self.merged.update((interval, row[0], int(row[2])) for row in rows)
+        self.files[interval] = open(filename, 'a', newline='')
+
+    def roll(self, date):
+        """Finish the current day's files and append further bars to ``date``'s."""
+        self.close()
+        self.merged.clear()
+        self.open_files(date)
@@ -0,0 +1,255 @@
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import tempfile
+import threading
+import contextlib
+import subprocess
+import importlib.util
+import resource
+import shutil
+import replay
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (producer script, FyersWebSocketClient keyword arguments)
+VARIANTS = {
+    "v0": ("main-producer.py", {}),
+    "v1": ("main-producerv1.py", {}),
+    "v2-csv": ("main-producerv2.py", {"sink_type": "csv"}),
+    "v2-delta": ("main-producerv2.py", {"sink_type": "delta"}),
+    "v2-sharded": ("main-producerv2.py", {"sink_type": "sharded"}),
+    "v2-journal": ("main-producerv2.py", {"sink_type": "csv", "journal_dir": "journal"}),
+    "v2-fanout": ("main-producerv2.py", {"sink_type": "csv", "fanout": "benchmark-ticks"}),
+    # feed_url is filled in with the address of a local replay.WebSocketStandIn.
+    "v2-websocket": ("main-producerv2.py", {"sink_type": "csv", "feed_url": None}),
+}
+
+# The send time (time.perf_counter() + STAMP_OFFSET) rides in the last CSV
+# column, chp, which every CSV-style sink writes. The offset keeps stamps apart
+# from real prices when scanning files.
+STAMP_FIELD = "chp"
+STAMP_OFFSET = 1e9
+TAIL_PATTERNS = ("*.csv", "*.dcsv", "*/*.log")
+
+
+class DiskTailer:
+    """Polls the output files and records when each stamped row becomes visible on disk."""
+
+    def __init__(self, directory, interval=0.001):
+        self.directory = directory
+        self.interval = interval
+        self.offsets = {}
+        self.latencies = []
+        self.last_seen = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def scan(self):
+        now = time.perf_counter()
+        for pattern in TAIL_PATTERNS:
+            for path in glob.glob(os.path.join(self.directory, pattern)):
+                offset = self.offsets.get(path, 0)
+                try:
+                    with open(path, 'rb') as file:
+                        file.seek(offset)
+                        data = file.read()
+                except OSError:
+                    continue
+                end = data.rfind(b"\n")
+                if end < 0:
+                    continue
+                self.offsets[path] = offset + end + 1
+                for line in data[:end].split(b"\n"):
+                    try:
+                        stamp = float(line.rsplit(b",", 1)[-1])
+                    except ValueError:
+                        continue
+                    if stamp > STAMP_OFFSET:
+                        self.latencies.append(now - (stamp - STAMP_OFFSET))
+                        self.last_seen = now
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.scan()
+            time.sleep(self.interval)
+        self.scan()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def load_producer(script):
+    replay.install()
+    spec = importlib.util.spec_from_file_location(script.replace("-", "_")[:-3], os.path.join(HERE, script))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_variant(name, ticks, symbols, rate, timeout):
+    """Run one producer variant in this process and return its measurements."""
+    script, options = VARIANTS[name]
+    module = load_producer(script)
+    universe = [f"NSE:SYN{i:04d}-EQ" for i in range(symbols)]
+    messages = list(replay.synthetic_messages(universe, ticks))
+    fake = replay.FakeFyersDataSocket
+    fake.source = messages
+    fake.rate = rate
+    fake.stamp_field = STAMP_FIELD
+    fake.stamp_offset = STAMP_OFFSET
+    server = None
+    if "feed_url" in options:
+        server = replay.WebSocketStandIn(messages, rate=rate, stamp_field=STAMP_FIELD,
+                                         stamp_offset=STAMP_OFFSET).start()
+        options = dict(options, feed_url=server.url)
+
+    workdir = tempfile.mkdtemp(prefix=f"bench-{name}-")
+    # main-producer.py builds its header path with a Windows separator, which
+    # lands one directory up on POSIX; keep that inside the temp dir too.
+    rundir = os.path.join(workdir, "run")
+    os.makedirs(rundir)
+    os.chdir(rundir)
+    tailer = DiskTailer(rundir)
+    tailer.thread.start()
+    depth_samples = []
+
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        client = module.FyersWebSocketClient("", **options)
+        client.symbols = list(universe)
+        stop_sampling = threading.Event()
+
+        def sample_depth():
+            while not stop_sampling.is_set():
+                depth = 0
+                ingest = getattr(client, "ingest", None)
+                if ingest is not None:
+                    depth += ingest.depth()
+                manager = getattr(client, "data_manager", None)
+                for recorder in list(getattr(manager, "data_recorders", {}).values()):
+                    queue = getattr(recorder, "queue", None)
+                    if queue is not None:
+                        depth += queue.qsize()
+                depth_samples.append(depth)
+                time.sleep(0.01)
+
+        sampler = threading.Thread(target=sample_depth, daemon=True)
+        sampler.start()
+        started = time.perf_counter()
+        if server:
+            # connect() keeps the calling thread until the feed stops.
+            threading.Thread(target=client.connect, daemon=True).start()
+            socket = server
+        else:
+            client.connect()
+            socket = fake.instances[-1]
+        socket.done.wait(timeout)
+        deadline = time.perf_counter() + timeout
+        while len(tailer.latencies) < socket.sent and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        stop_sampling.set()
+        if hasattr(client, "shutdown"):
+            client.shutdown()
+    tailer.stopped.set()
+    tailer.thread.join()
+
+    shutil.rmtree(workdir, ignore_errors=True)
+    written = len(tailer.latencies)
+    elapsed = (tailer.last_seen or time.perf_counter()) - started
+    latencies = tailer.latencies
+    return {
+        "variant": name,
+        "ticks": ticks,
+        "symbols": symbols,
+        "rate": rate,
+        "sent": socket.sent,
+        "written": written,
+        "ticks_per_sec": round(written / elapsed, 1) if elapsed > 0 else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        "max_queue_depth": max(depth_samples) if depth_samples else 0,
+        "mean_queue_depth": round(sum(depth_samples) / len(depth_samples), 1) if depth_samples else 0,
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput/latency benchmark of the producer variants")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="Comma separated subset of " + ",".join(VARIANTS))
+    parser.add_argument("--ticks", type=int, default=20_000)
+    parser.add_argument("--symbols", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=0, help="Offered ticks/sec, 0 for as fast as possible")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait per variant")
+    parser.add_argument("--baseline", help="JSON from an earlier --save-baseline run to compare against")
+    parser.add_argument("--save-baseline", help="Write this run's results to a baseline JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed throughput drop against the baseline before failing (0.2 = 20%%)")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = run_variant(args.child, args.ticks, args.symbols, args.rate, args.timeout)
+        sys.__stdout__.write(json.dumps(result) + "\n")
+        sys.__stdout__.flush()
+        os._exit(0)
+
+    results = {}
+    for name in args.variants.split(","):
+        if name not in VARIANTS:
+            parser.error(f"unknown variant {name}")
+        # Each variant runs in a fresh interpreter so RSS and leftover threads do not leak between them.
+        command = [sys.executable, os.path.abspath(__file__), "--child", name, "--ticks", str(args.ticks),
+                   "--symbols", str(args.symbols), "--rate", str(args.rate), "--timeout", str(args.timeout)]
+        completed = subprocess.run(command, capture_output=True, text=True, cwd=HERE)
+        lines = completed.stdout.strip().splitlines()
+        if completed.returncode != 0 or not lines:
+            print(f"{name}: failed\n{completed.stderr[-2000:]}")
+            results[name] = None
+            continue
+        results[name] = json.loads(lines[-1])
+
+    print(f"{'variant':<12}{'written':>10}{'ticks/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'max q':>8}{'rss MB':>9}")
+    for name, result in results.items():
+        if result is None:
+            continue
+        print(f"{name:<12}{result['written']:>10}{result['ticks_per_sec']:>12.0f}"
+              f"{result['p50_ms'] if result['p50_ms'] is not None else '-':>10}"
+              f"{result['p99_ms'] if result['p99_ms'] is not None else '-':>10}"
+              f"{result['max_queue_depth']:>8}{result['max_rss_mb']:>9}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    failed = [name for name, result in results.items() if result is None]
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        for name, result in results.items():
+            reference = baseline.get(name)
+            if result is None or not reference:
+                continue
+            if any(reference.get(key) != result[key] for key in ("ticks", "symbols", "rate")):
+                print(f"Skipping {name}: baseline was run with different --ticks/--symbols/--rate")
+                continue
+            floor = reference["ticks_per_sec"] * (1 - args.tolerance)
+            if result["ticks_per_sec"] < floor:
+                print(f"REGRESSION {name}: {result['ticks_per_sec']:.0f} ticks/s < {floor:.0f} "
+                      f"(baseline {reference['ticks_per_sec']:.0f})")
+                failed.append(name)
+            if result["written"] < result["sent"]:
+                print(f"LOST TICKS {name}: wrote {result['written']} of {result['sent']}")
+                failed.append(name)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
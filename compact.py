@@ -0,0 +1,264 @@
+import os
+import csv
+import sys
+import glob
+import gzip
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from sinks import BINARY_FIELDS, CSV_HEADER, INT_FIELDS, read_delta_csv
+from rollover import session_date
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    from tickstore import TICK_DTYPE
+    SUMMARY_DTYPE = np.dtype([("ticks", "<i8"), ("duplicates", "<i8"), ("first_time", "<i8"), ("last_time", "<i8"),
+                              ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8"),
+                              ("volume", "<i8"), ("vwap", "<f8"), ("spread_mean", "<f8"),
+                              ("spread_median", "<f8"), ("spread_max", "<f8"), ("spread_bps_mean", "<f8"),
+                              ("poc_price", "<f8")])
+
+# Recorder CSV columns (after the symbol) in the order they are parsed, and
+# where each lands in the binary record layout shared with tickstore.py.
+VALUE_COLUMNS = CSV_HEADER[1:]
+COLUMN_OF = {field: VALUE_COLUMNS.index(field) for field in BINARY_FIELDS}
+TICK_FILE_PATTERNS = ("*_data_{date}.csv", "*_data_{date}.csv.gz", "*_data_{date}.dcsv", "*_data_{date}.dcsv.gz")
+
+
+def day_files(directory, date):
+    paths = []
+    for pattern in TICK_FILE_PATTERNS:
+        paths.extend(glob.glob(os.path.join(directory, pattern.format(date=date))))
+    return sorted(paths)
+
+
+def read_lines(path):
+    """Data rows of a recorder CSV (plain or delta, optionally gzipped) as text lines, symbol first."""
+    opener = gzip.open if path.endswith(".gz") else open
+    if ".dcsv" in os.path.basename(path):
+        return [",".join(row) for row in read_delta_csv(path, opener)]
+    with opener(path, 'rt', newline='') as file:
+        text = file.read()
+    # A crash can leave a torn last row; only complete lines are parsed.
+    lines = text[:text.rfind("\n") + 1].splitlines()
+    return [line for line in lines[1:] if line]
+
+
+def parse_lines(lines):
+    """Parse CSV lines into a TICK_DTYPE array in one numpy call; missing ints become 0, floats NaN."""
+    count = len(lines)
+    records = np.zeros(count, dtype=TICK_DTYPE)
+    if not count:
+        return records
+    text = "\n".join(line.split(",", 1)[1] for line in lines)
+    # Empty cells are None on the recorder side; spell them out so loadtxt can read them.
+    text = text.replace(",,", ",nan,").replace(",,", ",nan,")
+    text = text.replace(",\n", ",nan\n").replace("\n,", "\nnan,")
+    if text.endswith(","):
+        text += "nan"
+    if text.startswith(","):
+        text = "nan" + text
+    values = np.loadtxt(text.splitlines(), delimiter=",", dtype=np.float64, ndmin=2)
+    for field in BINARY_FIELDS:
+        column = values[:, COLUMN_OF[field]]
+        if field in INT_FIELDS:
+            records[field] = np.nan_to_num(column, nan=0).astype(np.int64)
+        else:
+            records[field] = column
+    return records
+
+
+def sort_and_dedupe(records):
+    """Order by exch_feed_time (arrival order within a second) and drop repeated ticks.
+
+    A repeat has the same (exch_feed_time, vol_traded_today, ltp) as an earlier
+    tick, the key TickDeduper uses live.
+    """
+    arrival = np.arange(len(records))
+    feed_time = records["exch_feed_time"]
+    volume = records["vol_traded_today"]
+    ltp = np.nan_to_num(records["ltp"], nan=-1.0)
+    order = np.lexsort((arrival, ltp, volume, feed_time))
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = ((feed_time[order][1:] != feed_time[order][:-1]) | (volume[order][1:] != volume[order][:-1])
+                | (ltp[order][1:] != ltp[order][:-1]))
+    kept = order[keep]
+    kept = kept[np.lexsort((arrival[kept], feed_time[kept]))]
+    return records[kept], len(records) - len(kept)
+
+
+def summarize(records, duplicates, tick_size):
+    """Per-symbol summary row plus the volume profile (price levels, traded volume)."""
+    summary = np.zeros(1, dtype=SUMMARY_DTYPE)[0]
+    summary["ticks"] = len(records)
+    summary["duplicates"] = duplicates
+    empty = (np.empty(0, dtype=np.float64), np.empty(0, dtype=np.int64))
+    if not len(records):
+        return summary, empty
+    ltp = records["ltp"]
+    priced = ~np.isnan(ltp)
+    summary["first_time"] = records["exch_feed_time"][0]
+    summary["last_time"] = records["exch_feed_time"][-1]
+    # Volume traded between consecutive ticks; the first tick's predecessor is unknown.
+    traded = np.diff(records["vol_traded_today"], prepend=records["vol_traded_today"][0]).clip(min=0)
+    summary["volume"] = traded.sum()
+    if priced.any():
+        prices = ltp[priced]
+        summary["open"], summary["close"] = prices[0], prices[-1]
+        summary["high"], summary["low"] = prices.max(), prices.min()
+        weights = traded[priced]
+        summary["vwap"] = (prices * weights).sum() / weights.sum() if weights.sum() else np.nan
+    else:
+        summary["open"] = summary["close"] = summary["high"] = summary["low"] = summary["vwap"] = np.nan
+    bid, ask = records["bid_price"], records["ask_price"]
+    quoted = (bid > 0) & (ask > 0)
+    if quoted.any():
+        spread = ask[quoted] - bid[quoted]
+        summary["spread_mean"] = spread.mean()
+        summary["spread_median"] = np.median(spread)
+        summary["spread_max"] = spread.max()
+        summary["spread_bps_mean"] = (spread / ((ask[quoted] + bid[quoted]) / 2) * 10_000).mean()
+    else:
+        summary["spread_mean"] = summary["spread_median"] = summary["spread_max"] = np.nan
+        summary["spread_bps_mean"] = np.nan
+    if not priced.any():
+        summary["poc_price"] = np.nan
+        return summary, empty
+    levels, inverse = np.unique(np.round(ltp[priced] / tick_size).astype(np.int64), return_inverse=True)
+    volumes = np.bincount(inverse, weights=traded[priced]).astype(np.int64)
+    prices = np.round(levels * tick_size, 6)
+    summary["poc_price"] = prices[volumes.argmax()] if volumes.any() else np.nan
+    return summary, (prices, volumes)
+
+
+def compact_file(path, tick_size=0.05):
+    """Worker: parse, sort, dedupe and summarize one symbol's file in a single pass."""
+    lines = read_lines(path)
+    symbol = lines[0].split(",", 1)[0] if lines else None
+    records, duplicates = sort_and_dedupe(parse_lines(lines))
+    summary, profile = summarize(records, duplicates, tick_size)
+    return path, symbol, records, summary, profile
+
+
+class DayArchive:
+    """Read side of a compacted ``ticks_<date>.npz``: every symbol's ticks, summary and volume profile."""
+
+    def __init__(self, path):
+        if np is None:
+            raise RuntimeError("DayArchive requires numpy (pip install numpy)")
+        with np.load(path) as archive:
+            self.symbols = list(archive["symbols"])
+            self.offsets = archive["offsets"]
+            self.records = archive["ticks"]
+            self.summaries = archive["summary"]
+            self.profile_prices = archive["profile_prices"]
+            self.profile_volumes = archive["profile_volumes"]
+            self.profile_offsets = archive["profile_offsets"]
+        self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+
+    def ticks(self, symbol):
+        i = self.positions[symbol]
+        return self.records[self.offsets[i]:self.offsets[i + 1]]
+
+    def summary(self, symbol):
+        return self.summaries[self.positions[symbol]]
+
+    def profile(self, symbol):
+        i = self.positions[symbol]
+        start, end = self.profile_offsets[i], self.profile_offsets[i + 1]
+        return self.profile_prices[start:end], self.profile_volumes[start:end]
+
+
+def write_archive(path, results):
+    """One compressed .npz for the day; symbols sorted, written under a temporary name first."""
+    results = sorted(results, key=lambda result: result[0])
+    symbols = [symbol for symbol, _, _, _ in results]
+    offsets = np.cumsum([0] + [len(records) for _, records, _, _ in results])
+    profile_offsets = np.cumsum([0] + [len(profile[0]) for _, _, _, profile in results])
+    arrays = {
+        "symbols": np.array(symbols, dtype=str),
+        "offsets": offsets,
+        "ticks": np.concatenate([records for _, records, _, _ in results]) if results else np.zeros(0, TICK_DTYPE),
+        "summary": np.array([summary for _, _, summary, _ in results], dtype=SUMMARY_DTYPE),
+        "profile_prices": np.concatenate([profile[0] for _, _, _, profile in results]) if results else np.zeros(0),
+        "profile_volumes": (np.concatenate([profile[1] for _, _, _, profile in results]) if results
+                            else np.zeros(0, dtype=np.int64)),
+        "profile_offsets": profile_offsets,
+    }
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as file:
+        np.savez_compressed(file, **arrays)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def write_summary_csv(path, results):
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["symbol"] + list(SUMMARY_DTYPE.names))
+        for symbol, _, summary, _ in sorted(results, key=lambda result: result[0]):
+            writer.writerow([symbol] + [round(float(summary[name]), 6) if SUMMARY_DTYPE[name].kind == "f"
+                                        else int(summary[name]) for name in SUMMARY_DTYPE.names])
+
+
+def compact_day(paths, archive_path, summary_path=None, workers=None, tick_size=0.05):
+    """Compact the given files into one archive with a process pool; returns the per-symbol results."""
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(compact_file, path, tick_size): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                path, symbol, records, summary, profile = future.result()
+            except (OSError, ValueError) as e:
+                print(f"Error compacting {futures[future]}: {e}", file=sys.stderr)
+                continue
+            if symbol is None:
+                print(f"Skipping empty file {path}")
+                continue
+            if symbol in results:
+                # Recorded under two sinks the same day; merge the files.
+                records, duplicates = sort_and_dedupe(np.concatenate([results[symbol][1], records]))
+                duplicates += int(results[symbol][2]["duplicates"]) + int(summary["duplicates"])
+                summary, profile = summarize(records, duplicates, tick_size)
+            results[symbol] = (symbol, records, summary, profile)
+    results = list(results.values())
+    write_archive(archive_path, results)
+    if summary_path:
+        write_summary_csv(summary_path, results)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact a day's recorder CSVs into one archive with summaries")
+    parser.add_argument("files", nargs="*", help="Files to compact (default: every *_data_<date> CSV in --directory)")
+    parser.add_argument("--date", default=None, help="Session date, YYYY-MM-DD (default: today in IST)")
+    parser.add_argument("--directory", default=".")
+    parser.add_argument("--output", help="Archive path (default: <directory>/ticks_<date>.npz)")
+    parser.add_argument("--summary", help="Summary CSV path (default: <directory>/summary_<date>.csv)")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: one per CPU)")
+    parser.add_argument("--tick-size", type=float, default=0.05, help="Price step of the volume profile")
+    args = parser.parse_args()
+    if np is None:
+        parser.error("compact.py requires numpy (pip install numpy)")
+
+    date = args.date or session_date()
+    paths = args.files or day_files(args.directory, date)
+    if not paths:
+        parser.error(f"no tick files for {date} in {args.directory}")
+    archive_path = args.output or os.path.join(args.directory, f"ticks_{date}.npz")
+    summary_path = args.summary or os.path.join(args.directory, f"summary_{date}.csv")
+    started = time.time()
+    results = compact_day(paths, archive_path, summary_path, args.workers, args.tick_size)
+    ticks = sum(len(records) for _, records, _, _ in results)
+    duplicates = sum(int(summary["duplicates"]) for _, _, summary, _ in results)
+    print(f"Compacted {ticks} ticks of {len(results)} symbols from {len(paths)} files into {archive_path} "
+          f"({duplicates} duplicates dropped) in {time.time() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
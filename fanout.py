@@ -0,0 +1,227 @@
+import os
+import sys
+import time
+import struct
+import argparse
+from multiprocessing import shared_memory
+from journal import TICK_HEAD, decode_tick, encode_tick
+from sinks import BINARY_RECORD
+
+# Shared memory layout: FANOUT_HEADER (magic, slot size, slot count, reader
+# slots, state, last published seq), then ``max_readers`` READER entries
+# (pid, next seq to read, ticks missed) kept up to date by the subscribers,
+# then the ring of SLOT headers (seq, payload length) each followed by an
+# encoded tick in the journal's TICK payload format.
+FANOUT_MAGIC = b"NSEFAN01"
+FANOUT_HEADER = struct.Struct("<8sIIIIq")
+READER = struct.Struct("<qqq")
+SLOT = struct.Struct("<qI")
+SEQ = struct.Struct("<q")
+HEAD_OFFSET = FANOUT_HEADER.size - SEQ.size
+STATE_OFFSET = HEAD_OFFSET - 4
+OPEN = 1
+CLOSED = 2
+MAX_SYMBOL_BYTES = 64
+SLOT_SIZE = SLOT.size + TICK_HEAD.size + BINARY_RECORD.size + MAX_SYMBOL_BYTES
+
+
+def attach(name):
+    """Open an existing segment without letting this process's resource tracker unlink it at exit."""
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        # Python < 3.13 has no track=False.
+        from multiprocessing import resource_tracker
+        memory = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(memory._name, "shared_memory")
+        return memory
+
+
+class TickPublisher:
+    """Single-writer shared-memory ring that fans normalized ticks out to local processes.
+
+    Publishing never waits for a subscriber: each tick overwrites the oldest
+    slot and bumps the published seq. A subscriber that falls more than a ring
+    behind sees the slot seqs move past its cursor, counts the ticks it missed
+    and jumps to the oldest one still in the ring, so a slow consumer is
+    skipped instead of pushing back on ingest. Subscribers report their
+    cursor in the reader table, which ``consumers`` reads for the lag metrics.
+    """
+
+    def __init__(self, name="nse-ticks", slots=65536, max_readers=32):
+        self.name = name
+        self.slots = slots
+        self.max_readers = max_readers
+        self.readers_offset = FANOUT_HEADER.size
+        self.ring_offset = self.readers_offset + max_readers * READER.size
+        size = self.ring_offset + slots * SLOT_SIZE
+        try:
+            self.memory = shared_memory.SharedMemory(name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a publisher that crashed; its subscribers are gone with it.
+            stale = attach(name)
+            stale.unlink()
+            stale.close()
+            self.memory = shared_memory.SharedMemory(name, create=True, size=size)
+        self.buffer = self.memory.buf
+        self.buffer[:self.ring_offset] = bytes(self.ring_offset)
+        FANOUT_HEADER.pack_into(self.buffer, 0, FANOUT_MAGIC, SLOT_SIZE, slots, max_readers, OPEN, 0)
+        self.seq = 0
+        self.oversized = 0
+
+    def publish(self, tick):
+        """Write a tick into the next slot; returns its seq, or None if the symbol does not fit."""
+        seq = self.seq + 1
+        payload = encode_tick(seq, tick)
+        if len(payload) > SLOT_SIZE - SLOT.size:
+            self.oversized += 1
+            return None
+        buffer = self.buffer
+        offset = self.ring_offset + (seq % self.slots) * SLOT_SIZE
+        # Invalidate the slot first so a reader never pairs the new payload with the old seq.
+        SEQ.pack_into(buffer, offset, 0)
+        start = offset + SLOT.size
+        buffer[start:start + len(payload)] = payload
+        SLOT.pack_into(buffer, offset, seq, len(payload))
+        SEQ.pack_into(buffer, HEAD_OFFSET, seq)
+        self.seq = seq
+        return seq
+
+    def consumers(self):
+        """{pid: (lag, missed)} for registered subscribers; entries of dead processes are cleared."""
+        result = {}
+        for i in range(self.max_readers):
+            offset = self.readers_offset + i * READER.size
+            pid, cursor, missed = READER.unpack_from(self.buffer, offset)
+            if not pid:
+                continue
+            try:
+                os.kill(pid, 0)
+            except ProcessLookupError:
+                READER.pack_into(self.buffer, offset, 0, 0, 0)
+                continue
+            except PermissionError:
+                pass
+            result[pid] = (max(0, self.seq - cursor + 1), missed)
+        return result
+
+    def close(self):
+        """Tell subscribers the stream ended and remove the segment; mapped readers keep their view."""
+        struct.pack_into("<I", self.buffer, STATE_OFFSET, CLOSED)
+        self.buffer = None
+        self.memory.close()
+        self.memory.unlink()
+
+
+class TickSubscriber:
+    """Reads a TickPublisher ring from another process.
+
+    ``start="latest"`` begins with the next tick published, ``"oldest"`` with
+    the oldest one still in the ring. ``missed`` counts ticks overwritten
+    before this subscriber got to them.
+    """
+
+    def __init__(self, name="nse-ticks", start="latest"):
+        self.memory = attach(name)
+        self.buffer = self.memory.buf
+        magic, slot_size, self.slots, max_readers, _, head = FANOUT_HEADER.unpack_from(self.buffer, 0)
+        if magic != FANOUT_MAGIC or slot_size != SLOT_SIZE:
+            raise ValueError(f"{name} is not a tick fan-out segment in this format")
+        self.ring_offset = FANOUT_HEADER.size + max_readers * READER.size
+        self.cursor = head + 1 if start == "latest" else max(1, head - self.slots + 1)
+        self.missed = 0
+        self.reader_offset = None
+        # Registration is advisory (it only feeds the lag metrics), so no lock is taken.
+        for i in range(max_readers):
+            offset = FANOUT_HEADER.size + i * READER.size
+            if not READER.unpack_from(self.buffer, offset)[0]:
+                self.reader_offset = offset
+                READER.pack_into(self.buffer, offset, os.getpid(), self.cursor, 0)
+                break
+
+    def head(self):
+        return SEQ.unpack_from(self.buffer, HEAD_OFFSET)[0]
+
+    def closed(self):
+        return struct.unpack_from("<I", self.buffer, STATE_OFFSET)[0] == CLOSED
+
+    def read(self, max_batch=4096):
+        """Ticks published since the last call (at most ``max_batch``); never blocks."""
+        buffer = self.buffer
+        head = self.head()
+        ticks = []
+        while self.cursor <= head and len(ticks) < max_batch:
+            oldest = head - self.slots + 1
+            if self.cursor < oldest:
+                self.missed += oldest - self.cursor
+                self.cursor = oldest
+            offset = self.ring_offset + (self.cursor % self.slots) * SLOT_SIZE
+            seq, length = SLOT.unpack_from(buffer, offset)
+            if seq == self.cursor:
+                start = offset + SLOT.size
+                payload = bytes(buffer[start:start + length])
+                # Still the same seq after the copy means the publisher did not lap us mid-read.
+                if SEQ.unpack_from(buffer, offset)[0] == seq:
+                    ticks.append(decode_tick(payload)[1])
+                    self.cursor += 1
+                    continue
+            # Overwritten since head was read: catch up with the publisher and try again.
+            head = self.head()
+            if head - self.slots + 1 <= self.cursor:
+                break
+        if self.reader_offset is not None:
+            READER.pack_into(buffer, self.reader_offset, os.getpid(), self.cursor, self.missed)
+        return ticks
+
+    def ticks(self, poll_interval=0.0005):
+        """Yield ticks as they are published until the publisher closes the stream."""
+        while True:
+            batch = self.read()
+            if batch:
+                yield from batch
+            elif self.closed():
+                return
+            else:
+                time.sleep(poll_interval)
+
+    def close(self):
+        if self.reader_offset is not None:
+            READER.pack_into(self.buffer, self.reader_offset, 0, 0, 0)
+        self.buffer = None
+        self.memory.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Follow the collector's tick fan-out and report the read rate")
+    parser.add_argument("name", nargs="?", default="nse-ticks", help="Shared memory name given to --fanout")
+    parser.add_argument("--oldest", action="store_true", help="Start with the oldest tick still in the ring")
+    parser.add_argument("--print", action="store_true", help="Print every tick")
+    parser.add_argument("--delay", type=float, default=0, help="Sleep this long per tick, to simulate a slow consumer")
+    args = parser.parse_args()
+
+    try:
+        subscriber = TickSubscriber(args.name, start="oldest" if args.oldest else "latest")
+    except FileNotFoundError:
+        parser.error(f"no fan-out named {args.name}; is the collector running with --fanout?")
+    count = 0
+    started = last_report = time.time()
+    try:
+        for tick in subscriber.ticks():
+            count += 1
+            if args.print:
+                print(tick)
+            if args.delay:
+                time.sleep(args.delay)
+            now = time.time()
+            if now - last_report >= 1:
+                print(f"{count} ticks, {count / (now - started):.0f}/s, {subscriber.missed} missed", file=sys.stderr)
+                last_report = now
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Read {count} ticks, missed {subscriber.missed}", file=sys.stderr)
+        subscriber.close()
+
+
+if __name__ == "__main__":
+    main()
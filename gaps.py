@@ -0,0 +1,287 @@
+import os
+import csv
+import sys
+import time
+import queue
+import argparse
+import threading
+from collections import deque, namedtuple
+from bars import bar_filename, merge_bars
+from rollover import session_date
+
+# start/end are exch_feed_times (epoch seconds) of the last tick seen before
+# the gap and the first one after it; missed_volume is how much
+# vol_traded_today grew in between.
+Gap = namedtuple("Gap", "symbol start end missed_volume reason")
+GAP_HEADER = list(Gap._fields)
+
+
+class GapIndex:
+    """Append-only ``gaps_<date>.csv`` of detected gaps, with backfilled ones listed in ``gaps_<date>.done``.
+
+    Gaps are rare, so each append opens, writes and closes the file; nothing
+    is lost if the process dies right after.
+    """
+
+    def __init__(self, directory=".", worker_id=None):
+        self.directory = directory
+        self.suffix = "" if worker_id is None else f"_w{worker_id}"
+        self.lock = threading.Lock()
+
+    def path(self, date, extension="csv"):
+        return os.path.join(self.directory, f"gaps_{date}{self.suffix}.{extension}")
+
+    def append(self, gap, extension="csv"):
+        path = self.path(session_date(gap.start), extension)
+        with self.lock:
+            is_new = not os.path.exists(path)
+            with open(path, 'a', newline='') as file:
+                writer = csv.writer(file)
+                if is_new:
+                    writer.writerow(GAP_HEADER)
+                writer.writerow(gap)
+
+    def mark_done(self, gap):
+        self.append(gap, "done")
+
+    def read(self, path):
+        if not os.path.exists(path):
+            return []
+        with open(path, newline='') as file:
+            reader = csv.reader(file)
+            next(reader, None)
+            return [Gap(row[0], int(row[1]), int(row[2]), int(row[3]), row[4]) for row in reader if row]
+
+    def pending(self, date):
+        done = set(self.read(self.path(date, "done")))
+        return [gap for gap in self.read(self.path(date)) if gap not in done]
+
+
+class GapTracker:
+    """Watches per-symbol exch_feed_time and vol_traded_today continuity for holes in the stream.
+
+    A symbol has a gap when, across either a reconnect of the data socket
+    (``disconnected``/``connected`` are driven by the socket callbacks) or a
+    silence of at least ``min_gap`` seconds, its cumulative volume grew by more
+    than the new tick's own last_traded_qty: trades happened that no tick was
+    received for. The first trade of an illiquid contract after a quiet spell
+    accounts for all of its volume increase and is not a gap. ``observe`` runs
+    per tick on the client loop and costs one dict lookup when nothing is wrong.
+    """
+
+    def __init__(self, index, min_gap=60, on_gap=None):
+        self.index = index
+        self.min_gap = min_gap
+        self.on_gap = on_gap
+        # symbol -> [exch_feed_time, vol_traded_today, connection epoch] of its last tick.
+        self.last = {}
+        self.epoch = 0
+        self.down_since = None
+        self.outages = []
+        self.detected = {}
+
+    def disconnected(self, now=None):
+        if self.down_since is None:
+            self.down_since = time.time() if now is None else now
+
+    def connected(self, now=None):
+        """Called on every (re)connect; ticks after it are checked against the ones before."""
+        if self.down_since is not None:
+            self.outages.append((self.down_since, time.time() if now is None else now))
+            self.down_since = None
+        self.epoch += 1
+
+    def observe(self, tick):
+        feed_time = tick.exch_feed_time
+        volume = tick.vol_traded_today
+        if feed_time is None or volume is None:
+            return
+        last = self.last.get(tick.symbol)
+        if last is None:
+            self.last[tick.symbol] = [feed_time, volume, self.epoch]
+            return
+        if feed_time < last[0]:
+            return
+        # Volume the new tick's own trade does not account for.
+        missed = volume - last[1] - (tick.last_traded_qty or 0)
+        if missed > 0:
+            if last[2] != self.epoch:
+                self.record(Gap(tick.symbol, last[0], feed_time, volume - last[1], "reconnect"))
+            elif feed_time - last[0] >= self.min_gap:
+                self.record(Gap(tick.symbol, last[0], feed_time, volume - last[1], "silence"))
+        last[0] = feed_time
+        last[1] = volume
+        last[2] = self.epoch
+
+    def record(self, gap):
+        self.detected[gap.reason] = self.detected.get(gap.reason, 0) + 1
+        self.index.append(gap)
+        if self.on_gap:
+            self.on_gap(gap)
+
+
+class RateLimiter:
+    """Blocks callers so at most ``per_second`` and ``per_minute`` calls start in any such window."""
+
+    def __init__(self, per_second=10, per_minute=200):
+        self.limits = ((1.0, per_second), (60.0, per_minute))
+        self.calls = deque()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                while self.calls and now - self.calls[0] >= 60.0:
+                    self.calls.popleft()
+                wait = 0.0
+                for window, limit in self.limits:
+                    recent = [stamp for stamp in self.calls if now - stamp < window]
+                    if len(recent) >= limit:
+                        wait = max(wait, recent[-limit] + window - now)
+                if wait <= 0:
+                    self.calls.append(now)
+                    return
+            time.sleep(wait)
+
+
+class Backfiller:
+    """Fetches 1-minute candles for gaps through fyersModel's ``history`` and merges them into the bar store.
+
+    Gaps wait ``delay`` seconds past their end so the REST side has closed the
+    minutes. Gaps of one symbol less than ``batch_window`` seconds apart are
+    fetched with one request. ``workers`` threads share a RateLimiter set to
+    the API's limits; a rate-limit reply puts the request back after a
+    backoff. ``merge(date, rows)`` receives bar rows (symbol, "1m", start,
+    open, high, low, close, volume, vwap, ticks) with an empty vwap and ticks
+    of 0 to mark them as backfilled; the minutes a gap touches are replaced.
+    """
+
+    def __init__(self, rest, index, merge, workers=4, per_second=10, per_minute=200, delay=90, batch_window=1800,
+                 retries=5):
+        self.rest = rest
+        self.index = index
+        self.merge = merge
+        self.limiter = RateLimiter(per_second, per_minute)
+        self.delay = delay
+        self.batch_window = batch_window
+        self.retries = retries
+        self.waiting = []
+        self.lock = threading.Lock()
+        self.requests = queue.Queue()
+        self.fetched = 0
+        self.failed = 0
+        self.rate_limited = 0
+        threading.Thread(target=self.schedule, name="backfill-scheduler", daemon=True).start()
+        for i in range(workers):
+            threading.Thread(target=self.work, name=f"backfill-{i}", daemon=True).start()
+
+    def submit(self, gap):
+        with self.lock:
+            self.waiting.append(gap)
+
+    def pending(self):
+        with self.lock:
+            return len(self.waiting) + self.requests.unfinished_tasks
+
+    def schedule(self):
+        while True:
+            time.sleep(1)
+            now = time.time()
+            with self.lock:
+                due = [gap for gap in self.waiting if gap.end + self.delay <= now]
+                self.waiting = [gap for gap in self.waiting if gap.end + self.delay > now]
+            for batch in self.batches(due):
+                self.requests.put((batch, 0))
+
+    def batches(self, gaps):
+        """Group gaps per symbol into runs no more than ``batch_window`` apart."""
+        by_symbol = {}
+        for gap in sorted(gaps, key=lambda gap: (gap.symbol, gap.start)):
+            runs = by_symbol.setdefault(gap.symbol, [])
+            if runs and gap.start - runs[-1][-1].end <= self.batch_window:
+                runs[-1].append(gap)
+            else:
+                runs.append([gap])
+        return [run for runs in by_symbol.values() for run in runs]
+
+    def work(self):
+        while True:
+            batch, attempt = self.requests.get()
+            try:
+                self.fetch(batch, attempt)
+            except Exception as e:
+                self.failed += 1
+                print(f"Error backfilling {batch[0].symbol}: {e}")
+            finally:
+                self.requests.task_done()
+
+    def fetch(self, batch, attempt):
+        symbol = batch[0].symbol
+        first = min(gap.start for gap in batch) // 60 * 60
+        last = max(gap.end for gap in batch) // 60 * 60
+        self.limiter.acquire()
+        response = self.rest.history(data={"symbol": symbol, "resolution": "1", "date_format": "0",
+                                           "range_from": str(first), "range_to": str(last + 59), "cont_flag": "1"})
+        if response.get("s") != "ok":
+            if response.get("code") == 429 and attempt < self.retries:
+                self.rate_limited += 1
+                time.sleep(2 ** attempt)
+                self.requests.put((batch, attempt + 1))
+                return
+            raise RuntimeError(response.get("message", response))
+        minutes = set()
+        for gap in batch:
+            minutes.update(range(gap.start // 60 * 60, gap.end // 60 * 60 + 60, 60))
+        rows = [[symbol, "1m", int(start), open_, high, low, close, int(volume), "", 0]
+                for start, open_, high, low, close, volume in response.get("candles", []) if int(start) in minutes]
+        by_date = {}
+        for row in rows:
+            by_date.setdefault(session_date(row[2]), []).append(row)
+        for date, date_rows in by_date.items():
+            self.merge(date, date_rows)
+        for gap in batch:
+            self.index.mark_done(gap)
+        self.fetched += len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill the gaps recorded in gaps_<date>.csv into the 1m bars")
+    parser.add_argument("--date", default=None, help="Session date, YYYY-MM-DD (default: today in IST)")
+    parser.add_argument("--directory", default=".")
+    parser.add_argument("--worker-id", type=int, help="Read the gap index of this supervisor worker")
+    parser.add_argument("--stub", action="store_true", help="Use replay.StubFyersModel instead of the REST API")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    date = args.date or session_date()
+    index = GapIndex(args.directory, args.worker_id)
+    gaps = index.pending(date)
+    if not gaps:
+        print(f"No pending gaps for {date}")
+        return
+    if args.stub:
+        from replay import StubFyersModel
+        rest = StubFyersModel()
+    else:
+        from fyers_apiv3 import fyersModel
+        rest = fyersModel.FyersModel(client_id=os.environ.get("FYERS_CLIENT_ID", ""), is_async=False,
+                                     token=os.environ.get("FYERS_ACCESS_TOKEN", ""), log_path="")
+    # Only run this once the collector has stopped writing this day's bars.
+    lock = threading.Lock()
+
+    def merge(date, rows):
+        with lock:
+            merge_bars(os.path.join(args.directory, bar_filename("1m", date)), rows)
+
+    backfiller = Backfiller(rest, index, merge, workers=args.workers, delay=0)
+    for gap in gaps:
+        backfiller.submit(gap)
+    while backfiller.pending():
+        time.sleep(0.5)
+    print(f"Backfilled {backfiller.fetched} candles for {len(gaps)} gaps, {backfiller.failed} requests failed",
+          file=sys.stderr if backfiller.failed else sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import asyncio
+import time
+
+# Backpressure policies for a full ring: "drop" rejects the incoming tick,
+# "block" makes the callback thread wait (up to block_timeout) for free space
+# and drops the tick if none shows up.
+POLICIES = ("drop", "block")
+
+
+class IngestRing:
+    """Bounded single-producer/single-consumer ring between the socket thread and the event loop.
+
+    The websocket callback thread only stores the raw message in a preallocated
+    slot and bumps a counter; no lock, Future or loop hop is taken per tick. The
+    consumer task drains everything available in one batch. The loop is only
+    woken (one call_soon_threadsafe) when the consumer is parked on an empty ring.
+    Each slot also keeps the wall-clock receive time, handed to the consumer
+    with the batch so latency can be measured from the moment the socket
+    delivered the tick.
+    """
+
+    def __init__(self, capacity=65536, policy="drop", block_timeout=0.5, max_batch=4096):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.capacity = capacity
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.max_batch = max_batch
+        self.slots = [None] * capacity
+        self.stamps = [0.0] * capacity
+        # head is only advanced by the consumer, tail only by the producer.
+        self.head = 0
+        self.tail = 0
+        self.loop = None
+        self.wakeup = None
+        self.parked = False
+        self.closed = False
+        self.received = 0
+        self.dropped = 0
+        self.blocked = 0
+        self.drained = 0
+        self.batches = 0
+        self.failed = 0
+        self.high_watermark = 0
+        self.dropped_symbols = {}
+
+    def depth(self):
+        return self.tail - self.head
+
+    def put(self, message):
+        """Called from the socket thread; never touches the event loop unless it is parked."""
+        self.received += 1
+        if self.closed:
+            return self.drop(message)
+        if self.tail - self.head >= self.capacity:
+            if self.policy == "drop":
+                return self.drop(message)
+            self.blocked += 1
+            deadline = time.monotonic() + self.block_timeout
+            while self.tail - self.head >= self.capacity:
+                if time.monotonic() >= deadline:
+                    return self.drop(message)
+                time.sleep(0.0005)
+        index = self.tail % self.capacity
+        self.slots[index] = message
+        self.stamps[index] = time.time()
+        self.tail += 1
+        depth = self.tail - self.head
+        if depth > self.high_watermark:
+            self.high_watermark = depth
+        if self.parked:
+            self.parked = False
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+        return True
+
+    async def room(self):
+        """For a producer on the consumer's own loop: wait for a free slot instead of dropping."""
+        while self.tail - self.head >= self.capacity and not self.closed:
+            await asyncio.sleep(0.0005)
+
+    def drop(self, message):
+        self.dropped += 1
+        symbol = message.get("symbol") if isinstance(message, dict) else None
+        self.dropped_symbols[symbol] = self.dropped_symbols.get(symbol, 0) + 1
+        return False
+
+    def drain(self):
+        """Pop up to max_batch messages in arrival order, with their receive times."""
+        head = self.head
+        count = min(self.tail - head, self.max_batch)
+        batch = []
+        stamps = []
+        for i in range(head, head + count):
+            index = i % self.capacity
+            batch.append(self.slots[index])
+            stamps.append(self.stamps[index])
+            self.slots[index] = None
+        self.head = head + count
+        return batch, stamps
+
+    async def run(self, handler):
+        """Consumer loop: call ``handler(batch, stamps)`` per drained batch until closed and empty.
+
+        A handler may return an awaitable (e.g. a journal commit); the next batch
+        is drained only once it completes, so the ring absorbs ticks meanwhile.
+        A handler that raises loses its batch, not the consumer: the error is
+        logged and counted in ``failed`` and draining goes on.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        while True:
+            batch, stamps = self.drain()
+            if batch:
+                self.drained += len(batch)
+                self.batches += 1
+                try:
+                    pending = handler(batch, stamps)
+                    if pending is not None:
+                        await pending
+                except Exception as e:
+                    self.failed += 1
+                    print(f"Error handling an ingest batch of {len(batch)} messages: {e!r}")
+                # Let the recorder tasks run between large batches.
+                await asyncio.sleep(0)
+                continue
+            if self.closed:
+                break
+            self.wakeup.clear()
+            self.parked = True
+            # Re-check after parking so a tick stored just before the flag was set is not missed.
+            if self.depth() or self.closed:
+                self.parked = False
+                continue
+            await self.wakeup.wait()
+
+    def close(self):
+        """Stop accepting ticks; the consumer exits after draining what is left."""
+        self.closed = True
+        if self.loop is not None:
+            self.parked = False
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "dropped": self.dropped,
+            "blocked": self.blocked,
+            "drained": self.drained,
+            "batches": self.batches,
+            "failed": self.failed,
+            "depth": self.depth(),
+            "high_watermark": self.high_watermark,
+        }
@@ -0,0 +1,266 @@
+import os
+import math
+import operator
+import time
+import zlib
+import struct
+import queue
+import asyncio
+import threading
+from sinks import BINARY_FIELDS, BINARY_RECORD, binary_values
+from tick import Tick
+
+# Segment files start with JOURNAL_MAGIC and hold frames of
+# (payload length, crc32 of payload seeded with the kind, kind) + payload.
+JOURNAL_MAGIC = b"NSEWAL01"
+FRAME = struct.Struct("<IIB")
+TICK_HEAD = struct.Struct("<qI")
+CHECKPOINT_HEAD = struct.Struct("<qq")
+
+# Frame kinds:
+#   TICK       seq, bitmask of None fields, BINARY_RECORD, symbol
+#   ROUTE      symbol \0 sink filename -- where the following ticks of that symbol go
+#   CHECKPOINT seq, position, sink filename -- every tick routed there up to seq is
+#              durable in the sink, which held ``position`` (see Sink.position) at that point
+TICK = 1
+ROUTE = 2
+CHECKPOINT = 3
+
+get_binary_fields = operator.attrgetter(*BINARY_FIELDS)
+pack_record = BINARY_RECORD.pack
+pack_tick_head = TICK_HEAD.pack
+
+
+def encode_tick(seq, tick):
+    raw = get_binary_fields(tick)
+    if None in raw:
+        missing = 0
+        for i, value in enumerate(raw):
+            if value is None:
+                missing |= 1 << i
+        values = binary_values(tick)
+    else:
+        missing = 0
+        values = raw
+    try:
+        record = pack_record(*values)
+    except struct.error:
+        # Ints that arrived as floats from the socket.
+        record = pack_record(*binary_values(tick))
+    return pack_tick_head(seq, missing) + record + (tick.symbol or "").encode()
+
+
+def decode_tick(payload):
+    seq, missing = TICK_HEAD.unpack_from(payload)
+    values = BINARY_RECORD.unpack_from(payload, TICK_HEAD.size)
+    tick = Tick.__new__(Tick)
+    tick.symbol = payload[TICK_HEAD.size + BINARY_RECORD.size:].decode()
+    for i, (field, value) in enumerate(zip(BINARY_FIELDS, values)):
+        setattr(tick, field, None if missing & (1 << i) else value)
+    return seq, tick
+
+
+def read_frames(path):
+    """Yield (kind, payload) from a segment, stopping at the first torn or corrupt frame."""
+    with open(path, 'rb') as file:
+        data = file.read()
+    if data[:len(JOURNAL_MAGIC)] != JOURNAL_MAGIC:
+        return
+    offset = len(JOURNAL_MAGIC)
+    while offset + FRAME.size <= len(data):
+        length, crc, kind = FRAME.unpack_from(data, offset)
+        start = offset + FRAME.size
+        payload = data[start:start + length]
+        if len(payload) != length or zlib.crc32(payload, kind) != crc:
+            return
+        yield kind, payload
+        offset = start + length
+
+
+def frame(kind, payload):
+    return FRAME.pack(len(payload), zlib.crc32(payload, kind), kind) + payload
+
+
+class TickJournal:
+    """Write-ahead journal of ticks with group commit.
+
+    The client appends every tick of a drained ingest batch, then ``commit``
+    writes and fsyncs the whole batch in one go on an executor thread before the
+    ticks are handed to the recorders. While that fsync runs the ingest ring
+    keeps filling, so commits grow with load instead of costing one fsync per
+    tick. Recorders append CHECKPOINT frames after each fsync of their sink;
+    closed segments whose ticks are all covered by checkpoints are deleted.
+
+    Opening a journal reads whatever an earlier process left behind into
+    ``recovered`` ((sink filename, tick) for ticks past their sink's last
+    checkpoint) and ``rollbacks`` (sink filename -> checkpointed position); see
+    ``FyersWebSocketClient.recover``.
+    """
+
+    def __init__(self, directory="journal", segment_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self.seq = 0
+        self.routes = {}
+        # Sink filename -> symbols routed to it, so retire can drop their routes.
+        self.routed = {}
+        self.checkpoints = {}
+        self.committed_checkpoints = {}
+        self.last_seq = {}
+        self.buffer = bytearray()
+        self.recovered = []
+        self.rollbacks = {}
+        self.stale_segments = self.segment_paths()
+        self.read_stale()
+        self.segments = []
+        self.file = None
+        self.open_segment()
+        # A daemon thread rather than an executor: main-producerv2.py's main thread
+        # returns after connect(), and concurrent.futures workers stop at that point.
+        self.requests = queue.SimpleQueue()
+        threading.Thread(target=self.run_writer, name="journal-writer", daemon=True).start()
+
+    def segment_paths(self):
+        names = sorted(name for name in os.listdir(self.directory)
+                       if name.startswith("wal-") and name.endswith(".log"))
+        return [os.path.join(self.directory, name) for name in names]
+
+    def read_stale(self):
+        routes = {}
+        checkpoints = {}
+        ticks = []
+        for path in self.stale_segments:
+            for kind, payload in read_frames(path):
+                if kind == TICK:
+                    seq, tick = decode_tick(payload)
+                    ticks.append((seq, routes.get(tick.symbol), tick))
+                    self.seq = max(self.seq, seq)
+                elif kind == ROUTE:
+                    symbol, filename = payload.decode().split("\0", 1)
+                    routes[symbol] = filename
+                elif kind == CHECKPOINT:
+                    seq, position = CHECKPOINT_HEAD.unpack_from(payload)
+                    checkpoints[payload[CHECKPOINT_HEAD.size:].decode()] = (seq, position)
+        for seq, filename, tick in ticks:
+            if seq > checkpoints.get(filename, (0, 0))[0]:
+                self.recovered.append((filename, tick))
+        self.rollbacks = {filename: position for filename, (_, position) in checkpoints.items()}
+
+    def open_segment(self):
+        """Start a new segment headed by the current routes and checkpoints."""
+        if self.file:
+            self.file.close()
+        # The time suffix keeps a new segment from reusing a stale one's name.
+        path = os.path.join(self.directory, f"wal-{self.seq + 1:016d}-{time.time_ns()}.log")
+        head = bytearray(JOURNAL_MAGIC)
+        for symbol, filename in self.routes.items():
+            head += frame(ROUTE, f"{symbol}\0{filename}".encode())
+        for filename, (seq, position) in self.checkpoints.items():
+            head += frame(CHECKPOINT, CHECKPOINT_HEAD.pack(seq, position) + filename.encode())
+        self.file = open(path, 'wb')
+        self.file.write(head)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.committed_checkpoints = dict(self.checkpoints)
+        self.segments.append((self.seq + 1, path))
+
+    def route(self, symbol, filename):
+        previous = self.routes.get(symbol)
+        if previous is not None:
+            self.routed[previous].discard(symbol)
+        self.routes[symbol] = filename
+        self.routed.setdefault(filename, set()).add(symbol)
+        self.buffer += frame(ROUTE, f"{symbol}\0{filename}".encode())
+
+    def append(self, tick):
+        """Stage a tick (its symbol must already be routed); returns its sequence number."""
+        seq = self.seq + 1
+        filename = self.routes[tick.symbol]
+        # Encode before taking the seq, so a tick that fails to encode leaves no trace.
+        self.buffer += frame(TICK, encode_tick(seq, tick))
+        self.seq = seq
+        self.last_seq[filename] = seq
+        return seq
+
+    def checkpoint(self, filename, seq, position):
+        self.checkpoints[filename] = (seq, position)
+        self.buffer += frame(CHECKPOINT, CHECKPOINT_HEAD.pack(seq, position) + filename.encode())
+
+    def retire(self, filename):
+        """Forget a closed sink whose ticks are all checkpointed, so long runs do not accumulate them.
+
+        Symbols still routed to it lose their route (new segment heads only carry
+        live ones); their next tick is routed to the file that replaced it.
+        """
+        seq = self.checkpoints.get(filename, (0, 0))[0]
+        if self.last_seq.get(filename, 0) <= seq:
+            self.last_seq.pop(filename, None)
+            self.checkpoints.pop(filename, None)
+            self.committed_checkpoints.pop(filename, None)
+            for symbol in self.routed.pop(filename, ()):
+                del self.routes[symbol]
+
+    def write(self, data):
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def run_writer(self):
+        while True:
+            data, loop, done = self.requests.get()
+            try:
+                self.write(data)
+            except OSError as e:
+                loop.call_soon_threadsafe(done.set_exception, e)
+            else:
+                loop.call_soon_threadsafe(done.set_result, None)
+
+    async def commit(self):
+        """Group commit everything staged so far; runs the fsync off the event loop."""
+        data = self.buffer
+        if not data:
+            return
+        self.buffer = bytearray()
+        checkpoints = dict(self.checkpoints)
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        self.requests.put((data, loop, done))
+        await done
+        self.committed_checkpoints = checkpoints
+        if self.file.tell() >= self.segment_bytes:
+            self.open_segment()
+            self.prune()
+
+    def safe_seq(self):
+        """Highest seq below which every tick is durable in its sink."""
+        safe = math.inf
+        for filename, last in self.last_seq.items():
+            covered = self.committed_checkpoints.get(filename, (0, 0))[0]
+            if last > covered:
+                safe = min(safe, covered)
+        return safe
+
+    def prune(self):
+        """Delete closed segments whose ticks have all landed in the sinks."""
+        safe = self.safe_seq()
+        while len(self.segments) > 1 and self.segments[1][0] - 1 <= safe:
+            os.remove(self.segments.pop(0)[1])
+
+    def discard_stale(self):
+        """Drop the previous process's segments once their ticks are re-journaled."""
+        for path in self.stale_segments:
+            os.remove(path)
+        self.stale_segments = []
+
+    def close(self):
+        """Commit what is left and remove every segment if all ticks have landed."""
+        if self.buffer:
+            self.write(self.buffer)
+            self.buffer = bytearray()
+        self.committed_checkpoints = dict(self.checkpoints)
+        self.file.close()
+        if self.safe_seq() >= self.seq:
+            for _, path in self.segments:
+                os.remove(path)
+            self.segments = []
@@ -1,128 +1,742 @@
 import os
-import csv
+import json
 import signal
+import argparse
 import asyncio
 import threading
 import time
 from fyers_apiv3.FyersWebsocket import data_ws
+from bars import BarAggregator, BarCsvSink, bar_filename, merge_bars
+from fanout import TickPublisher
+from gaps import Backfiller, GapIndex, GapTracker
+from ingest import IngestRing
+from journal import TickJournal
+from metrics import Metrics, serve_metrics
+from quotes import QuoteCache, serve_quotes
+from rollover import Compressor, seconds_to_rollover, session_date
+from sinks import SINKS, make_sink, shard_for, sink_class_for
+from subscriptions import MAX_SYMBOLS, SubscriptionManager, batches, read_symbols_file, serve_control
+from tick import DepthUpdate, Tick, TickDeduper
+from wsfeed import WebSocketFeed
 
 
 class AsyncDataRecorderManager:
-    def __init__(self):
+    def __init__(self, sink_type="csv", sink_options=None, recorder_options=None, shards=8, worker_id=None,
+                 journal=None):
         self.data_recorders = {}
+        self.routes = {}
         self.lock = threading.Lock()
+        self.sink_type = sink_type
+        self.sink_options = sink_options or {}
+        self.recorder_options = recorder_options or {}
+        self.shards = shards
+        self.worker_id = worker_id
+        self.journal = journal
+        # Session (IST) date the current files are named after; see roll().
+        self.date = session_date()
+        # Recorder key per routed symbol, and the symbols routed to each key.
+        self.keys = {}
+        self.members = {}
+        # Closed recorders by filename, until their session ends; see finished().
+        self.closed = {}
+
+    def recorder_key(self, symbol):
+        """Per-symbol files by default; in sharded mode every symbol maps onto one of N shard logs."""
+        date = self.date
+        if self.sink_type == "sharded":
+            # Workers under the supervisor each get their own shard directory.
+            directory = f"ticks_{date}" if self.worker_id is None else f"ticks_{date}_w{self.worker_id}"
+            return os.path.join(directory, f"shard-{shard_for(symbol, self.shards):02d}")
+        return f"{symbol[4:]}_data_{date}"
 
     def get_recorder(self, symbol):
         """Get or create a recorder for the given symbol."""
+        recorder = self.routes.get(symbol)
+        if recorder is not None:
+            return recorder
         with self.lock:
-            if symbol not in self.data_recorders:
-                filename = f"{symbol[4:]}_data_{time.strftime('%Y-%m-%d')}.csv"
-                self.data_recorders[symbol] = AsyncDataRecorder(filename)
-            return self.data_recorders[symbol]
+            key = self.recorder_key(symbol)
+            if key not in self.data_recorders:
+                sink = make_sink(self.sink_type, key, **self.sink_options)
+                self.data_recorders[key] = AsyncDataRecorder(sink, journal=self.journal, date=self.date,
+                                                             **self.recorder_options)
+                # Reopened after an eviction: the file is still being written.
+                self.closed.pop(sink.filename, None)
+            recorder = self.routes[symbol] = self.data_recorders[key]
+            self.keys[symbol] = key
+            self.members.setdefault(key, set()).add(symbol)
+            if self.journal:
+                self.journal.route(symbol, recorder.filename)
+            return recorder
+
+    def get_file_recorder(self, filename, symbol):
+        """Get or create the recorder for a file ``symbol`` was journaled to, which may be from an earlier session."""
+        key = os.path.splitext(filename)[0]
+        with self.lock:
+            recorder = self.data_recorders.get(key)
+            if recorder is None:
+                # The earlier run may have used another sink type; its options do not carry over.
+                sink_class = sink_class_for(filename)
+                options = self.sink_options if sink_class is SINKS[self.sink_type] else {}
+                # A file recorder_key does not name for today belongs to a session that has ended.
+                date = self.date if key == self.recorder_key(symbol) else None
+                recorder = self.data_recorders[key] = AsyncDataRecorder(
+                    sink_class(filename, **options), journal=self.journal, date=date, **self.recorder_options)
+                self.closed.pop(filename, None)
+            return recorder
+
+    async def release(self, symbols):
+        """Drop the routes of unsubscribed symbols; recorders nobody routes to any more are flushed and closed."""
+        closing = []
+        with self.lock:
+            for symbol in symbols:
+                key = self.keys.pop(symbol, None)
+                if key is None:
+                    continue
+                del self.routes[symbol]
+                members = self.members[key]
+                members.discard(symbol)
+                if not members:
+                    del self.members[key]
+                    closing.append(self.data_recorders.pop(key))
+        # Each recorder drains and closes on its own task; the others keep running meanwhile.
+        await asyncio.gather(*(recorder.close() for recorder in closing))
+        self.mark_closed(closing)
+        return len(closing)
+
+    def mark_closed(self, recorders):
+        """Note closed recorders so their files are finished once their session ends."""
+        with self.lock:
+            for recorder in recorders:
+                self.closed[recorder.filename] = recorder
+
+    def finished(self):
+        """Take the closed recorders whose session has ended and whose files were not reopened since."""
+        with self.lock:
+            done = [recorder for recorder in self.closed.values() if recorder.date != self.date]
+            for recorder in done:
+                del self.closed[recorder.filename]
+        return done
+
+    def roll(self, date):
+        """Switch to a new session date; returns the old recorders for the caller to close and mark_closed.
+
+        New recorders are created lazily by get_recorder as ticks arrive.
+        """
+        with self.lock:
+            recorders = list(self.data_recorders.values())
+            self.data_recorders = {}
+            self.routes = {}
+            self.keys = {}
+            self.members = {}
+            self.date = date
+        return recorders
+
+    def evict(self, idle_seconds, max_open):
+        """Close recorders idle for ``idle_seconds``, then the least recently active ones above ``max_open``.
+
+        Only recorders with nothing queued or staged are candidates, so they can
+        be closed synchronously; a later tick simply reopens the file. Evicted
+        files are finished (see finished) once their session has ended.
+        """
+        now = time.monotonic()
+        with self.lock:
+            idle = sorted((recorder.last_active, key) for key, recorder in self.data_recorders.items()
+                          if recorder.is_idle())
+            evict = [key for last_active, key in idle if now - last_active >= idle_seconds]
+            excess = len(self.data_recorders) - len(evict) - max_open
+            if excess > 0:
+                evict += [key for _, key in idle[len(evict):len(evict) + excess]]
+            for key in evict:
+                for symbol in self.members.pop(key, ()):
+                    del self.routes[symbol]
+                    del self.keys[symbol]
+                recorder = self.data_recorders.pop(key)
+                recorder.close_now()
+                self.closed[recorder.filename] = recorder
+        return len(evict)
+
+
+# fsync policies: "none" leaves durability to the OS, "batch" fsyncs after every
+# flushed batch, "interval" fsyncs at most once every fsync_ms.
+FSYNC_POLICIES = ("none", "batch", "interval")
 
-import os
-import csv
-import asyncio
-import threading
-import time
-from fyers_apiv3.FyersWebsocket import data_ws
 
 class AsyncDataRecorder:
-    def __init__(self, filename):
-        self.filename = filename
+    def __init__(self, sink, flush_rows=500, flush_bytes=64 * 1024, flush_ms=250,
+                 fsync_policy="interval", fsync_ms=1000, metrics=None, verbose=False, journal=None, date=None):
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy: {fsync_policy}")
+        self.sink = sink
+        self.filename = sink.filename
+        # Session date the file belongs to (None: an earlier, already ended one).
+        self.date = date
+        self.flush_rows = flush_rows
+        self.flush_bytes = flush_bytes
+        self.flush_ms = flush_ms
+        self.fsync_policy = fsync_policy
+        self.fsync_ms = fsync_ms
+        self.verbose = verbose
+        self.written = metrics.counter("ticks_written_total", "Ticks flushed to a sink", "symbol") if metrics else None
+        self.durable_latency = metrics.histogram(
+            "tick_latency_seconds", "Per-stage tick latency", (("stage", "enqueue_to_fsync"),)) if metrics else None
+        # Rows per symbol flushed since the last fsync and their enqueue times, for the metrics above.
+        self.pending_symbols = {}
+        self.pending_stamps = []
+        # Journal seq of the last buffered row and of the last checkpoint written for this sink.
+        self.journal = journal
+        self.buffered_seq = self.checkpointed_seq = journal.seq if journal else 0
+        if journal:
+            journal.checkpoint(self.filename, self.checkpointed_seq, sink.position())
         self.lock = threading.Lock()
         self.queue = asyncio.Queue()
-        self.loop = asyncio.get_event_loop()
+        # Recorders are created by dispatch, so this is always the client loop.
+        self.loop = asyncio.get_running_loop()
+        self.pending_rows = 0
+        self.pending_since = None
+        # Sinks that hold rows past a flush (Parquet row groups) say when those are due.
+        self.sink_due_in = getattr(sink, "due_in", None)
+        self.last_fsync = time.monotonic()
+        self.last_active = time.monotonic()
         self.processing_task = self.loop.create_task(self.process_queue())
-        self.ensure_file_exists()
-
-    def ensure_file_exists(self):
-        path = os.getcwd()
-        full_path = os.path.join(path, self.filename)
-        if not os.path.exists(full_path):
-            with open(full_path, mode='w', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(["symbol", "ltp", "vol_traded_today", "last_traded_time", "exch_feed_time",
-                                 "bid_size", "ask_size", "bid_price", "ask_price", "last_traded_qty",
-                                 "tot_buy_qty", "tot_sell_qty", "avg_trade_price", "low_price",
-                                 "high_price", "lower_ckt", "upper_ckt", "open_price", "prev_close_price",
-                                 "ch", "chp"])
-            print(f"Created file with headers: {full_path}")
-        else:
-            print(f"File already exists: {full_path}")
 
-    async def save_to_file(self, data):
-        await self.queue.put(data)
-        print(f"Data queued for {data.get('symbol')}")
+    def enqueue(self, tick, enqueued_at=None, seq=None):
+        """Queue a tick from code already running on the recorder's loop."""
+        self.queue.put_nowait((tick, enqueued_at or time.time(), seq))
+
+    def buffer_row(self, tick, enqueued_at, seq=None):
+        self.sink.write(tick)
+        if seq is not None:
+            self.buffered_seq = seq
+        if self.written is not None:
+            self.pending_symbols[tick.symbol] = self.pending_symbols.get(tick.symbol, 0) + 1
+            self.pending_stamps.append(enqueued_at)
+        if self.pending_rows == 0:
+            self.pending_since = time.monotonic()
+        self.pending_rows += 1
+
+    def batch_full(self):
+        return self.pending_rows >= self.flush_rows or self.sink.staged_bytes() >= self.flush_bytes
+
+    def batch_stale(self):
+        return self.pending_rows > 0 and (time.monotonic() - self.pending_since) * 1000 >= self.flush_ms
+
+    def flush_timeout(self):
+        """Seconds until the staged batch (or rows the sink still holds) must be flushed; None if nothing is."""
+        if self.pending_rows:
+            return max(0, self.flush_ms / 1000 - (time.monotonic() - self.pending_since))
+        if self.sink_due_in:
+            return self.sink_due_in()
+        return None
+
+    def flush(self, force_fsync=False):
+        """Flush the staged batch to the sink and apply the fsync policy."""
+        now = time.monotonic()
+        fsync = force_fsync or self.fsync_policy == "batch" or (
+                self.fsync_policy == "interval" and (now - self.last_fsync) * 1000 >= self.fsync_ms)
+        rows = self.pending_rows
+        with self.lock:
+            self.sink.flush(fsync=fsync)
+        self.pending_rows = 0
+        self.pending_since = None
+        if fsync:
+            self.last_fsync = now
+            if self.journal and self.buffered_seq > self.checkpointed_seq:
+                position = self.sink.position()
+                if position is not None:
+                    self.journal.checkpoint(self.filename, self.buffered_seq, position)
+                    self.checkpointed_seq = self.buffered_seq
+        if self.written is not None:
+            self.record_flush(fsync or self.fsync_policy == "none")
+        if rows and self.verbose:
+            print(f"Data saved for {rows} rows to {self.filename}")
+
+    def record_flush(self, durable):
+        written = self.written
+        for symbol, count in self.pending_symbols.items():
+            written[symbol] = written.get(symbol, 0) + count
+        self.pending_symbols.clear()
+        # With fsync_policy "none" a row counts as durable once it is handed to the OS.
+        if durable and self.pending_stamps:
+            done = time.time()
+            record = self.durable_latency.record
+            for stamp in self.pending_stamps:
+                record(done - stamp)
+            self.pending_stamps.clear()
+
+    def safe_flush(self, force_fsync=False):
+        try:
+            self.flush(force_fsync)
+        except IOError as e:
+            print(f"Error saving data to {self.filename}: {e}")
 
     async def process_queue(self):
         while True:
-            data = await self.queue.get()
-            if data is None:
-                break
             try:
-                with self.lock:
-                    with open(self.filename, 'a', newline='') as file:
-                        writer = csv.writer(file)
-                        writer.writerow([
-                            data.get("symbol"), data.get("ltp"), data.get("vol_traded_today"),
-                            data.get("last_traded_time"), data.get("exch_feed_time"),
-                            data.get("bid_size"), data.get("ask_size"), data.get("bid_price"),
-                            data.get("ask_price"), data.get("last_traded_qty"),
-                            data.get("tot_buy_qty"), data.get("tot_sell_qty"), data.get("avg_trade_price"),
-                            data.get("low_price"), data.get("high_price"), data.get("lower_ckt"),
-                            data.get("upper_ckt"), data.get("open_price"), data.get("prev_close_price"),
-                            data.get("ch"), data.get("chp")
-                        ])
-                print(f"Data saved for {data.get('symbol')} to {self.filename}")
-            except IOError as e:
-                print(f"Error saving data for {data.get('symbol')}: {e}")
-            finally:
+                timeout = self.flush_timeout()
+                if timeout is not None:
+                    data = await asyncio.wait_for(self.queue.get(), timeout)
+                else:
+                    data = await self.queue.get()
+            except asyncio.TimeoutError:
+                self.safe_flush()
+                continue
+            # Drain whatever else is already queued into the same batch.
+            while data is not None:
+                self.buffer_row(*data)
+                self.queue.task_done()
+                if self.batch_full():
+                    self.safe_flush()
+                if self.queue.empty():
+                    break
+                data = self.queue.get_nowait()
+            if data is None:
                 self.queue.task_done()
+                self.safe_flush(force_fsync=self.fsync_policy != "none")
+                break
+            self.last_active = time.monotonic()
+            if self.batch_stale():
+                self.safe_flush()
+        self.finish()
+
+    def finish(self):
+        self.sink.close()
+        # Sinks such as Parquet only write their last rows on close.
+        if self.journal and self.buffered_seq > self.checkpointed_seq:
+            self.journal.checkpoint(self.filename, self.buffered_seq, self.sink.position())
+
+    def is_idle(self):
+        return self.pending_rows == 0 and self.queue.empty()
+
+    def close_now(self):
+        """Close an idle recorder without waiting on its task."""
+        self.processing_task.cancel()
+        self.finish()
 
     def stop_processing(self):
         self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
-        self.loop.run_until_complete(self.processing_task)
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self.wait_stopped(), self.loop).result()
+        else:
+            self.loop.run_until_complete(self.processing_task)
+
+    async def wait_stopped(self):
+        await self.processing_task
+
+    async def close(self):
+        """Flush what is queued and close the sink, from the recorder's own loop."""
+        self.queue.put_nowait(None)
+        await self.processing_task
 
 class FyersWebSocketClient:
-    def __init__(self, access_token):
+    def __init__(self, access_token, sink_type="csv", ingest_capacity=65536, ingest_policy="drop", shards=8,
+                 symbols=None, worker_id=None, bar_intervals=None, bar_grace=2, dedup=False, verbose=False,
+                 journal_dir=None, max_symbols=MAX_SYMBOLS, idle_timeout=300, max_open=2000, compress=True,
+                 feed_url=None, fanout=None, gaps=False, backfill=None, backfill_delay=90):
         self.access_token = access_token
-        self.symbols = ['NSE:SPIC-EQ', 'NSE:YESBANK-EQ']
-        self.data_type = "SymbolUpdate"
-        self.data_manager = AsyncDataRecorderManager()
+        self.fyers = None
+        # With a feed URL, JSON-framed ticks from a stand-in or relay are read on the client loop
+        # (wsfeed.WebSocketFeed); without one the SDK's socket thread connects to Fyers.
+        self.feed_url = feed_url
+        # The depth sink records five-level DepthUpdate books instead of SymbolUpdate ticks.
+        self.data_type = "DepthUpdate" if sink_type == "depth" else "SymbolUpdate"
+        self.subscriptions = SubscriptionManager(symbols or ['NSE:SPIC-EQ', 'NSE:YESBANK-EQ'],
+                                                 data_type=self.data_type, max_symbols=max_symbols,
+                                                 on_removed=self.close_symbols)
+        self.worker_id = worker_id
+        self.verbose = verbose
+        self.metrics = Metrics()
+        self.journal = TickJournal(journal_dir) if journal_dir else None
+        self.data_manager = AsyncDataRecorderManager(sink_type=sink_type, shards=shards, worker_id=worker_id,
+                                                     recorder_options={"metrics": self.metrics, "verbose": verbose},
+                                                     journal=self.journal)
+        self.ingest = IngestRing(capacity=ingest_capacity, policy=ingest_policy)
+        self.quotes = QuoteCache()
+        self.deduper = TickDeduper() if dedup else None
+        # Shared-memory ring other local processes read ticks from; see fanout.py.
+        self.publisher = TickPublisher(fanout) if fanout else None
+        # Volume continuity per symbol; gaps go to gaps_<date>.csv and, with a REST client, to the backfiller.
+        self.gap_index = GapIndex(worker_id=worker_id) if gaps or backfill else None
+        self.backfiller = (Backfiller(backfill, self.gap_index, self.merge_backfill, delay=backfill_delay)
+                           if backfill else None)
+        self.gaps = (GapTracker(self.gap_index, on_gap=self.backfiller.submit if self.backfiller else None)
+                     if self.gap_index else None)
+        self.idle_timeout = idle_timeout
+        self.max_open = max_open
+        self.maintenance_interval = 5
+        self.compressor = Compressor() if compress else None
+        self.stopping = asyncio.Event()
+        self.bars = (BarAggregator(BarCsvSink(bar_intervals), bar_intervals, grace=bar_grace)
+                     if bar_intervals else None)
+        self.duplicate_symbols = {}
+        self.unsubscribed_symbols = {}
+        # Messages dispatch failed on, per symbol (None when the message had no usable one).
+        self.failed_symbols = {}
+        self.commit_failures = 0
+        # Journaled ticks waiting for the next group commit; ingest waits once
+        # commit_ticks of them pile up behind the commit in flight.
+        self.unreleased = []
+        self.commit_ticks = 16384
+        # Whether a release task (see release) is running, and the latest one.
+        self.releasing = False
+        self.release_task = None
+        self.register_metrics()
         self.is_shutting_down = False
         self.loop = asyncio.new_event_loop()
         threading.Thread(target=self.start_event_loop, daemon=True).start()
+        if self.journal:
+            asyncio.run_coroutine_threadsafe(self.recover(), self.loop).result()
+        dispatch = self.dispatch_depth if self.data_type == "DepthUpdate" else self.dispatch
+        self.ingest_task = asyncio.run_coroutine_threadsafe(self.ingest.run(dispatch), self.loop)
+        self.bars_closing = False
+        if self.bars:
+            self.bars_task = asyncio.run_coroutine_threadsafe(self.close_idle_bars(), self.loop)
+        self.maintenance_task = asyncio.run_coroutine_threadsafe(self.maintain(), self.loop)
+        self.subscriptions.start()
+        if self.backfiller:
+            # Gaps an earlier run of today recorded but did not get to.
+            pending = self.gap_index.pending(session_date())
+            for gap in pending:
+                self.backfiller.submit(gap)
+            if pending:
+                print(f"Resubmitted {len(pending)} gaps to backfill")
+
+    @property
+    def symbols(self):
+        return list(self.subscriptions.active)
+
+    @symbols.setter
+    def symbols(self, symbols):
+        self.subscriptions.reset(symbols)
 
     def start_event_loop(self):
         asyncio.set_event_loop(self.loop)
         self.loop.run_forever()
 
-    async def onmessage(self, message):
-        symbol = message.get("symbol")
-        if symbol and not self.is_shutting_down:
-            print(f"Received message for {symbol}: {message}")
-            recorder = self.data_manager.get_recorder(symbol)
-            await recorder.save_to_file(message)
+    def register_metrics(self):
+        metrics = self.metrics
+        self.received = metrics.counter("ticks_received_total", "Ticks taken off the ingest ring", "symbol")
+        self.queued = metrics.counter("ticks_queued_total", "Ticks handed to a recorder queue", "symbol")
+        self.feed_latency = metrics.histogram("tick_latency_seconds", "Per-stage tick latency",
+                                              (("stage", "feed_to_receive"),))
+        self.enqueue_latency = metrics.histogram("tick_latency_seconds", "Per-stage tick latency",
+                                                 (("stage", "receive_to_enqueue"),))
+        metrics.observe("ticks_dropped_total", "counter", "Ticks dropped before reaching a recorder",
+                        self.dropped_counts)
+        metrics.gauge("recorder_queue_depth", "Ticks waiting in each recorder queue",
+                      lambda: {(("recorder", key),): recorder.queue.qsize()
+                               for key, recorder in list(self.data_manager.data_recorders.items())})
+        metrics.gauge("ingest_ring_depth", "Messages waiting in the ingest ring", self.ingest.depth)
+        metrics.gauge("subscribed_symbols", "Symbols subscribed on the data socket",
+                      lambda: len(self.subscriptions.active))
+        self.commit_latency = metrics.histogram("journal_commit_seconds", "Journal group commit (write + fsync)")
+        metrics.observe("journal_commit_failures_total", "counter", "Group commits whose write or fsync failed",
+                        lambda: self.commit_failures)
+        metrics.observe("ingest_batch_errors_total", "counter",
+                        "Ingest batches whose handler raised past the per-message error handling",
+                        lambda: self.ingest.failed)
+        if self.feed_url:
+            metrics.observe("feed_bad_frames_total", "counter",
+                            "Feed frames, or elements of them, that were not message dicts",
+                            lambda: self.fyers.bad_frames if self.fyers else 0)
+        if self.publisher:
+            metrics.gauge("fanout_published_seq", "Seq of the last tick published to the fan-out ring",
+                          lambda: self.publisher.seq)
+            metrics.gauge("fanout_consumer_lag", "Ticks each fan-out subscriber is behind the publisher",
+                          lambda: {(("pid", pid),): lag for pid, (lag, _) in self.publisher.consumers().items()})
+            metrics.observe("fanout_consumer_missed_total", "counter",
+                            "Ticks overwritten before a slow fan-out subscriber read them",
+                            lambda: {(("pid", pid),): missed
+                                     for pid, (_, missed) in self.publisher.consumers().items()})
+        if self.gaps:
+            metrics.observe("gaps_detected_total", "counter", "Holes in a symbol's tick stream, by cause",
+                            lambda: {(("reason", reason),): count for reason, count in self.gaps.detected.items()})
+        if self.backfiller:
+            metrics.gauge("backfill_pending", "Gaps waiting for or being fetched by the backfiller",
+                          self.backfiller.pending)
+            metrics.observe("backfill_candles_total", "counter", "Candles merged into the 1m bars by the backfiller",
+                            lambda: self.backfiller.fetched)
+
+    def dropped_counts(self):
+        counts = {}
+        for symbol, count in list(self.ingest.dropped_symbols.items()):
+            counts[(("symbol", symbol), ("reason", "backpressure"))] = count
+        for symbol, count in list(self.duplicate_symbols.items()):
+            counts[(("symbol", symbol), ("reason", "duplicate"))] = count
+        for symbol, count in list(self.unsubscribed_symbols.items()):
+            counts[(("symbol", symbol), ("reason", "unsubscribed"))] = count
+        for symbol, count in list(self.failed_symbols.items()):
+            counts[(("symbol", symbol), ("reason", "error"))] = count
+        return counts
+
+    def dispatch(self, batch, stamps):
+        """Convert a drained ingest batch to Ticks and fan them out to the recorders."""
+        get_recorder = self.data_manager.get_recorder
+        from_message = Tick.from_message
+        update_quote = self.quotes.update
+        publish = self.publisher.publish if self.publisher else None
+        update_bars = self.bars.update if self.bars else None
+        seen = self.deduper.seen if self.deduper else None
+        observe_gap = self.gaps.observe if self.gaps else None
+        received = self.received
+        queued = self.queued
+        record_feed = self.feed_latency.record
+        record_enqueue = self.enqueue_latency.record
+        verbose = self.verbose
+        journal = self.journal
+        active = self.subscriptions.active
+        ready = self.unreleased
+        now = time.time
+        for message, received_at in zip(batch, stamps):
+            symbol = None
+            try:
+                symbol = message.get("symbol")
+                if symbol:
+                    if verbose:
+                        print(f"Received message for {symbol}: {message}")
+                    received[symbol] = received.get(symbol, 0) + 1
+                    if symbol not in active:
+                        # Still in flight when the symbol was unsubscribed; its recorder may be closed.
+                        self.unsubscribed_symbols[symbol] = self.unsubscribed_symbols.get(symbol, 0) + 1
+                        continue
+                    tick = from_message(message)
+                    # exch_feed_time has one second resolution, so this stage is coarse.
+                    if tick.exch_feed_time:
+                        record_feed(received_at - tick.exch_feed_time)
+                    if seen and seen(tick):
+                        self.duplicate_symbols[symbol] = self.duplicate_symbols.get(symbol, 0) + 1
+                        continue
+                    if observe_gap:
+                        observe_gap(tick)
+                    update_quote(tick)
+                    if publish:
+                        publish(tick)
+                    if update_bars:
+                        update_bars(tick)
+                    if journal:
+                        # Route first so the recorder's opening checkpoint precedes this tick's seq.
+                        recorder = get_recorder(symbol)
+                        ready.append((recorder, tick, received_at, journal.append(tick)))
+                        continue
+                    enqueued_at = now()
+                    get_recorder(symbol).enqueue(tick, enqueued_at)
+                    record_enqueue(enqueued_at - received_at)
+                    queued[symbol] = queued.get(symbol, 0) + 1
+            except Exception as e:
+                # One bad message must not take down the only ingest consumer.
+                self.failed(symbol, e)
+        # Group commit: one commit is in flight at a time and every tick journaled
+        # during its fsync goes into the next, so commits grow with load while a
+        # tick waits for at most the commit ahead of it and its own.
+        if ready and not self.releasing:
+            self.start_release()
+        elif len(ready) >= self.commit_ticks:
+            return self.release_task
+
+    def dispatch_depth(self, batch, stamps):
+        """Hand DepthUpdate messages to the per-symbol depth recorders, which keep the books."""
+        get_recorder = self.data_manager.get_recorder
+        from_message = DepthUpdate.from_message
+        received = self.received
+        queued = self.queued
+        record_enqueue = self.enqueue_latency.record
+        active = self.subscriptions.active
+        now = time.time
+        for message, received_at in zip(batch, stamps):
+            symbol = None
+            try:
+                symbol = message.get("symbol")
+                if not symbol:
+                    continue
+                if self.verbose:
+                    print(f"Received depth for {symbol}: {message}")
+                received[symbol] = received.get(symbol, 0) + 1
+                if symbol not in active:
+                    self.unsubscribed_symbols[symbol] = self.unsubscribed_symbols.get(symbol, 0) + 1
+                    continue
+                enqueued_at = now()
+                get_recorder(symbol).enqueue(from_message(message, received_at), enqueued_at)
+                record_enqueue(enqueued_at - received_at)
+                queued[symbol] = queued.get(symbol, 0) + 1
+            except Exception as e:
+                self.failed(symbol, e)
+
+    def failed(self, symbol, error):
+        """Count a message dispatch could not handle; only the first failure per symbol is logged."""
+        if not isinstance(symbol, str):
+            symbol = None
+        count = self.failed_symbols[symbol] = self.failed_symbols.get(symbol, 0) + 1
+        if count == 1:
+            print(f"Error handling message for {symbol}, dropping it: {error!r}")
+
+    def start_release(self):
+        self.releasing = True
+        self.release_task = self.loop.create_task(self.release())
+
+    async def release(self):
+        """Commit the journaled ticks, then hand them to the recorders; repeats while more were journaled meanwhile."""
+        queued = self.queued
+        record_enqueue = self.enqueue_latency.record
+        now = time.time
+        try:
+            while self.unreleased:
+                ready, self.unreleased = self.unreleased, []
+                started = time.time()
+                try:
+                    await self.journal.commit()
+                except OSError as e:
+                    # The ticks are still recorded below; only their journal copy is lost.
+                    self.commit_failures += 1
+                    print(f"Error committing the journal, {len(ready)} ticks are not journaled: {e}")
+                self.commit_latency.record(time.time() - started)
+                for recorder, tick, received_at, seq in ready:
+                    enqueued_at = now()
+                    recorder.enqueue(tick, enqueued_at, seq)
+                    record_enqueue(enqueued_at - received_at)
+                    queued[tick.symbol] = queued.get(tick.symbol, 0) + 1
+        finally:
+            self.releasing = False
+
+    async def recover(self):
+        """Replay ticks a crashed run journaled but never made durable in their sinks.
+
+        Each sink is first cut back to its last checkpoint, which drops any rows
+        written after it, so replaying every later tick neither loses nor
+        duplicates rows. Ticks go back to the file they were journaled for, so
+        a restart after the IST date changed still completes yesterday's files.
+        """
+        journal = self.journal
+        if not journal.stale_segments:
+            return
+        for filename, position in journal.rollbacks.items():
+            sink_class_for(filename).rollback(filename, position)
+        ready = []
+        for filename, tick in journal.recovered:
+            if self.deduper:
+                # A reconnect may resend these; let the deduper recognise them.
+                self.deduper.seen(tick)
+            self.quotes.update(tick)
+            if filename is None:
+                recorder = self.data_manager.get_recorder(tick.symbol)
+            else:
+                recorder = self.data_manager.get_file_recorder(filename, tick.symbol)
+            # Live ticks re-route the symbol to today's file through get_recorder.
+            if journal.routes.get(tick.symbol) != recorder.filename:
+                journal.route(tick.symbol, recorder.filename)
+            ready.append((recorder, tick, time.time(), journal.append(tick)))
+        await journal.commit()
+        journal.discard_stale()
+        for recorder, tick, received_at, seq in ready:
+            recorder.enqueue(tick, received_at, seq)
+        print(f"Recovered {len(ready)} ticks from the journal, rolled back {len(journal.rollbacks)} sinks")
+
+    def close_symbols(self, symbols):
+        """Called by the subscription manager after unsubscribing; closes recorders on the client loop."""
+        asyncio.run_coroutine_threadsafe(self.release_symbols(symbols), self.loop)
+
+    async def settle(self):
+        """Hand every journaled tick to its recorder before recorders are closed."""
+        if self.unreleased and not self.releasing:
+            self.start_release()
+        if self.releasing:
+            await self.release_task
+
+    async def release_symbols(self, symbols):
+        await self.settle()
+        closed = await self.data_manager.release(symbols)
+        print(f"Closed {closed} recorders for {len(symbols)} unsubscribed symbols")
+
+    async def maintain(self):
+        """Roll files over at the IST date boundary and evict idle recorders in between."""
+        while not self.stopping.is_set():
+            wait = min(self.maintenance_interval, seconds_to_rollover() + 0.01)
+            try:
+                await asyncio.wait_for(self.stopping.wait(), wait)
+                break
+            except asyncio.TimeoutError:
+                pass
+            date = session_date()
+            if date != self.data_manager.date:
+                await self.rollover(date)
+            elif not self.unreleased and not self.releasing:
+                evicted = self.data_manager.evict(self.idle_timeout, self.max_open)
+                if evicted:
+                    print(f"Evicted {evicted} idle recorders, {len(self.data_manager.data_recorders)} open")
+                # Recovered files of an earlier session are finished as soon as they are evicted.
+                self.finish_files()
+
+    async def rollover(self, date):
+        await self.settle()
+        recorders = self.data_manager.roll(date)
+        await asyncio.gather(*(recorder.close() for recorder in recorders))
+        self.data_manager.mark_closed(recorders)
+        if self.bars:
+            self.bars.sink.roll(date)
+        finished = self.finish_files()
+        print(f"Rolled over to {date}: closed {len(recorders)} recorders, finished {finished} files "
+              f"from the previous session")
+
+    def finish_files(self):
+        """Retire closed files of ended sessions from the journal and queue them for compression."""
+        recorders = self.data_manager.finished()
+        for recorder in recorders:
+            if self.journal:
+                self.journal.retire(recorder.filename)
+            if self.compressor and recorder.sink.compressible:
+                self.compressor.submit(recorder.filename)
+        return len(recorders)
+
+    async def close_idle_bars(self):
+        """Close bars for symbols that went quiet; runs on the client loop next to dispatch."""
+        while not self.bars_closing:
+            await asyncio.sleep(1)
+            self.bars.close_idle()
+        self.bars.close_all()
 
     def onmessage_sync(self, message):
-        asyncio.run_coroutine_threadsafe(self.onmessage(message), self.loop)
+        if not self.is_shutting_down:
+            self.ingest.put(message)
+
+    async def merge_into_bars(self, date, rows):
+        sink = self.bars.sink if self.bars else None
+        if sink and sink.date == date and "1m" in sink.files:
+            sink.merge("1m", rows)
+        else:
+            merge_bars(bar_filename("1m", date), rows)
+
+    def merge_backfill(self, date, rows):
+        """Called from a backfill thread; the merge runs on the loop so it cannot interleave with bar writes."""
+        asyncio.run_coroutine_threadsafe(self.merge_into_bars(date, rows), self.loop).result()
 
     def onerror(self, message):
         print("Fyers WebSocket Error:", message)
+        if self.gaps:
+            self.gaps.disconnected()
 
     def onclose(self, message):
         print("Connection closed:", message)
+        if self.gaps:
+            self.gaps.disconnected()
 
     def onopen(self):
+        if self.gaps:
+            self.gaps.connected()
         self.subscribe_initial_symbols()
 
     def subscribe_initial_symbols(self):
-        uppercase_symbols = [symbol.upper() for symbol in self.symbols]
-        self.fyers.subscribe(symbols=uppercase_symbols, data_type=self.data_type)
+        self.subscriptions.attach(self.fyers)
         self.fyers.keep_running()
 
     def connect(self):
+        if self.feed_url:
+            self.fyers = WebSocketFeed(self.feed_url, self.ingest, on_connect=self.onopen, on_close=self.onclose,
+                                       on_error=self.onerror, reconnect_retry=10, loop=self.loop)
+            self.feed_task = asyncio.run_coroutine_threadsafe(self.fyers.run(), self.loop)
+            # Only daemon threads are left, so keep the main thread (and signal handling) here.
+            self.feed_task.result()
+            if not self.is_shutting_down:
+                self.shutdown()
+            return
         self.fyers = data_ws.FyersDataSocket(
             access_token=self.access_token,
             log_path="",
@@ -138,33 +752,155 @@ class FyersWebSocketClient:
         self.fyers.connect()
 
     def add_symbols(self, symbols):
-        uppercase_symbols = [symbol.upper() for symbol in symbols]
-        self.symbols.extend(uppercase_symbols)
-        if self.fyers:
-            self.fyers.subscribe(symbols=uppercase_symbols, data_type=self.data_type)
-        return f"Subscribed to new symbols: {symbols}, List of Subscribed symbols {self.symbols}"
+        """Queue symbols for the next batched subscribe."""
+        self.subscriptions.add(symbols)
+        return f"Queued subscription for symbols: {symbols}"
 
     def remove_symbols(self, symbols):
-        uppercase_symbols = [symbol.upper() for symbol in symbols]
-        self.symbols = [s for s in self.symbols if s not in uppercase_symbols]
-        if self.fyers:
-            self.fyers.unsubscribe(symbols=uppercase_symbols, data_type=self.data_type)
-        return f"Unsubscribed from symbols: {symbols}, List of Subscribed symbols {self.symbols}"
+        """Queue symbols for the next batched unsubscribe; their recorders are closed afterwards."""
+        self.subscriptions.remove(symbols)
+        return f"Queued unsubscription for symbols: {symbols}"
+
+    def status(self):
+        """Health snapshot written to the status file for the supervisor."""
+        return {
+            "worker_id": self.worker_id,
+            "date": self.data_manager.date,
+            "pid": os.getpid(),
+            "time": time.time(),
+            "symbols": len(self.subscriptions.active),
+            "rejected_symbols": self.subscriptions.rejected,
+            "recorders": len(self.data_manager.data_recorders),
+            "ingest": self.ingest.stats(),
+            "duplicates": self.deduper.duplicates if self.deduper else 0,
+            "gaps": dict(self.gaps.detected) if self.gaps else {},
+            "outages": self.gaps.outages[-10:] if self.gaps else [],
+            "backfill_pending": self.backfiller.pending() if self.backfiller else 0,
+        }
+
+    def start_status_writer(self, path, interval=5):
+        def write_status():
+            while not self.is_shutting_down:
+                tmp_path = path + ".tmp"
+                with open(tmp_path, 'w') as file:
+                    json.dump(self.status(), file)
+                os.replace(tmp_path, path)
+                time.sleep(interval)
+        threading.Thread(target=write_status, daemon=True).start()
 
     def shutdown(self):
         self.is_shutting_down = True
         print("Shutting down gracefully...")
+        self.subscriptions.stop()
+        self.ingest.close()
+        self.ingest_task.result()
+        if self.journal:
+            asyncio.run_coroutine_threadsafe(self.settle(), self.loop).result()
+        print(f"Ingest stats: {self.ingest.stats()}")
+        if self.deduper:
+            print(f"Dropped {self.deduper.duplicates} duplicate ticks")
+        if self.bars:
+            # Ingest is drained, so no more bar updates can arrive.
+            self.bars_closing = True
+            self.bars_task.result()
+        self.loop.call_soon_threadsafe(self.stopping.set)
+        self.maintenance_task.result()
         for recorder in self.data_manager.data_recorders.values():
             recorder.stop_processing()
+        if self.journal:
+            self.journal.close()
+        if self.publisher:
+            self.publisher.close()
+        if self.backfiller and self.backfiller.pending():
+            print(f"{self.backfiller.pending()} gaps not backfilled yet; the next start (or gaps.py) picks them up")
         if self.fyers:
-            self.fyers.unsubscribe(symbols=self.symbols, data_type=self.data_type)
+            for chunk in batches(self.symbols, self.subscriptions.batch_size):
+                self.fyers.unsubscribe(symbols=chunk, data_type=self.data_type)
+        if self.feed_url and self.fyers:
+            self.fyers.close_connection()
+            self.feed_task.result()
         if self.fyers:
             self.fyers.keep_running = False
         self.loop.call_soon_threadsafe(self.loop.stop)
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Record Fyers SymbolUpdate ticks")
+    parser.add_argument("--symbols", help="Comma separated symbols, e.g. NSE:SBIN-EQ,NSE:TCS-EQ")
+    parser.add_argument("--symbols-file", help="Symbols file used instead of --symbols; edits subscribe/unsubscribe live")
+    parser.add_argument("--control-socket", help="Accept add/remove/set/list commands on this Unix socket")
+    parser.add_argument("--max-symbols", type=int, default=MAX_SYMBOLS, help="Per-connection symbol limit")
+    parser.add_argument("--sink", default="csv", choices=list(SINKS),
+                        help="depth records five-level DepthUpdate books instead of SymbolUpdate ticks")
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--worker-id", type=int)
+    parser.add_argument("--status-file", help="Write a JSON health snapshot here every --status-interval seconds")
+    parser.add_argument("--status-interval", type=float, default=5)
+    parser.add_argument("--dedup", action="store_true", help="Drop repeated ticks (e.g. replays after a reconnect)")
+    parser.add_argument("--bars", help="Comma separated bar intervals to aggregate, e.g. 1s,1m,5m")
+    parser.add_argument("--bar-grace", type=float, default=2,
+                        help="Seconds of feed time past a quiet symbol's bar end before the bar is emitted")
+    parser.add_argument("--quotes-port", type=int, help="Serve the latest-quote API on 127.0.0.1:PORT")
+    parser.add_argument("--quotes-socket", help="Serve the latest-quote API on this Unix socket path")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--fanout", metavar="NAME",
+                        help="Publish ticks to the shared-memory ring NAME for local subscribers (see fanout.py)")
+    parser.add_argument("--gaps", action="store_true",
+                        help="Track per-symbol gaps in the tick stream and write them to gaps_<date>.csv")
+    parser.add_argument("--backfill", choices=("fyers", "stub"),
+                        help="Fetch 1m candles for each gap from the Fyers history API (stub: replay.StubFyersModel) "
+                             "into the 1m bars; implies --gaps")
+    parser.add_argument("--backfill-delay", type=float, default=90,
+                        help="Seconds after a gap ends before its candles are fetched")
+    parser.add_argument("--idle-timeout", type=float, default=300,
+                        help="Close recorders that received nothing for this many seconds")
+    parser.add_argument("--max-open", type=int, default=2000, help="Keep at most this many recorders open")
+    parser.add_argument("--no-compress", action="store_true", help="Leave finished CSV files uncompressed")
+    parser.add_argument("--journal", help="Journal ticks to this directory before recording; replayed after a crash")
+    parser.add_argument("--feed-url",
+                        help="Read JSON-framed ticks from this websocket URL (replay.py --websocket, or a relay) on "
+                             "the client loop instead of connecting to Fyers through the SDK")
+    parser.add_argument("--verbose", action="store_true", help="Print every received, queued and saved tick")
+    args = parser.parse_args()
+    if args.sink == "depth" and (args.journal or args.bars or args.dedup or args.fanout or args.gaps or args.backfill):
+        parser.error("--sink depth records order books; --journal, --bars, --dedup, --fanout, --gaps and --backfill "
+                     "need SymbolUpdate ticks")
+    return args
+
+
 def main():
-    access_token = ""
-    client = FyersWebSocketClient(access_token)
+    args = parse_args()
+    # The supervisor hands the token over the environment rather than argv.
+    access_token = os.environ.get("FYERS_ACCESS_TOKEN", "")
+    symbols = args.symbols.split(",") if args.symbols else None
+    if args.symbols_file:
+        symbols = read_symbols_file(args.symbols_file)
+    backfill = None
+    if args.backfill == "stub":
+        from replay import StubFyersModel
+        backfill = StubFyersModel()
+    elif args.backfill:
+        from fyers_apiv3 import fyersModel
+        backfill = fyersModel.FyersModel(client_id=os.environ.get("FYERS_CLIENT_ID", ""), token=access_token,
+                                         is_async=False, log_path="")
+    client = FyersWebSocketClient(access_token, sink_type=args.sink, shards=args.shards,
+                                  symbols=symbols, worker_id=args.worker_id,
+                                  bar_intervals=args.bars.split(",") if args.bars else None,
+                                  bar_grace=args.bar_grace, dedup=args.dedup,
+                                  verbose=args.verbose, journal_dir=args.journal, max_symbols=args.max_symbols,
+                                  idle_timeout=args.idle_timeout, max_open=args.max_open,
+                                  compress=not args.no_compress, feed_url=args.feed_url,
+                                  fanout=args.fanout, gaps=args.gaps, backfill=backfill,
+                                  backfill_delay=args.backfill_delay)
+    if args.symbols_file:
+        client.subscriptions.watch(args.symbols_file)
+    if args.control_socket:
+        serve_control(client.subscriptions, args.control_socket)
+    if args.status_file:
+        client.start_status_writer(args.status_file, args.status_interval)
+    if args.quotes_port is not None or args.quotes_socket:
+        serve_quotes(client.quotes, port=args.quotes_port, unix_socket=args.quotes_socket)
+    if args.metrics_port is not None:
+        serve_metrics(client.metrics, port=args.metrics_port)
 
     # Register signal handlers for graceful shutdown
     def signal_handler(sig, frame):
@@ -0,0 +1,174 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Latency histograms keep values in microseconds. Below SUB_BUCKETS every value
+# has its own bucket; above it each power of two is split into HALF_BUCKETS
+# linear buckets, so any recorded value is off by less than 1/64 (~1.6%).
+SUB_BITS = 7
+SUB_BUCKETS = 1 << SUB_BITS
+HALF_BUCKETS = SUB_BUCKETS // 2
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    shift = value.bit_length() - SUB_BITS
+    return SUB_BUCKETS + (shift - 1) * HALF_BUCKETS + (value >> shift) - HALF_BUCKETS
+
+
+def bucket_value(index):
+    """Midpoint of the values that land in ``index``."""
+    if index < SUB_BUCKETS:
+        return index
+    shift = (index - SUB_BUCKETS) // HALF_BUCKETS + 1
+    low = ((index - SUB_BUCKETS) % HALF_BUCKETS + HALF_BUCKETS) << shift
+    return low + ((1 << shift) - 1) / 2
+
+
+class LatencyHistogram:
+    """HDR-style log-linear histogram: O(1) record into a fixed array of counts.
+
+    Values above ``max_seconds`` are clamped into the top bucket and counted in
+    ``overflows``. Recording is meant for a single thread (the client loop);
+    readers on other threads get a slightly stale but consistent-enough view.
+    """
+
+    def __init__(self, max_seconds=60):
+        self.max_value = int(max_seconds * 1_000_000)
+        self.counts = [0] * (bucket_index(self.max_value) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.overflows = 0
+
+    def record(self, seconds):
+        # Negative values (clock skew against the exchange feed time) count as zero.
+        value = int(seconds * 1_000_000)
+        if value < 0:
+            value = 0
+        elif value > self.max_value:
+            value = self.max_value
+            self.overflows += 1
+        self.counts[bucket_index(value)] += 1
+        self.count += 1
+        self.total += value / 1_000_000
+
+    def quantile(self, fraction):
+        """Value in seconds below which ``fraction`` of the recorded values fall."""
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bucket_value(index) / 1_000_000
+        return self.max_value / 1_000_000
+
+
+class Metrics:
+    """Counters, latency histograms and gauges for the producer, rendered as Prometheus text.
+
+    Counters are plain dicts bumped from the client loop only. Observed
+    families (gauges, or counters kept by another component) are callbacks
+    evaluated at scrape time, so reading a queue depth costs nothing on the
+    hot path.
+    """
+
+    def __init__(self):
+        self.help = {}
+        self.types = {}
+        self.counters = {}
+        self.labels = {}
+        self.histograms = {}
+        self.observed = {}
+
+    def describe(self, name, kind, text):
+        self.types[name] = kind
+        self.help[name] = text
+
+    def counter(self, name, text, label):
+        """Register a counter family with one label; returns its {label value: count} dict."""
+        self.describe(name, "counter", text)
+        self.labels[name] = label
+        return self.counters.setdefault(name, {})
+
+    def histogram(self, name, text, labels=(), max_seconds=60):
+        self.describe(name, "summary", text)
+        family = self.histograms.setdefault(name, {})
+        return family.setdefault(labels, LatencyHistogram(max_seconds))
+
+    def observe(self, name, kind, text, callback):
+        """``callback()`` returns a number or a {labels: value} dict at scrape time."""
+        self.describe(name, kind, text)
+        self.observed[name] = callback
+
+    def gauge(self, name, text, callback):
+        self.observe(name, "gauge", text, callback)
+
+    def render(self):
+        lines = []
+        for name, family in self.counters.items():
+            self.header(lines, name)
+            label = self.labels[name]
+            for key, value in list(family.items()):
+                lines.append(f"{name}{format_labels(((label, key),))} {value}")
+        for name, family in self.histograms.items():
+            self.header(lines, name)
+            for labels, histogram in list(family.items()):
+                for q in QUANTILES:
+                    lines.append(f"{name}{format_labels(labels + (('quantile', q),))} {histogram.quantile(q):.6f}")
+                lines.append(f"{name}_sum{format_labels(labels)} {histogram.total:.6f}")
+                lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+        for name, callback in self.observed.items():
+            self.header(lines, name)
+            value = callback()
+            if isinstance(value, dict):
+                for labels, item in value.items():
+                    lines.append(f"{name}{format_labels(labels)} {item}")
+            else:
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def header(self, lines, name):
+        lines.append(f"# HELP {name} {self.help[name]}")
+        lines.append(f"# TYPE {name} {self.types[name]}")
+
+
+def format_labels(labels):
+    """(("symbol", "NSE:SBIN-EQ"),) -> {symbol="NSE:SBIN-EQ"}"""
+    if not labels:
+        return ""
+    parts = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}"
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """GET /metrics in the Prometheus text exposition format."""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(metrics, port, host="127.0.0.1"):
+    """Start the /metrics endpoint on a background thread."""
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+    return server
@@ -0,0 +1,107 @@
+import os
+import json
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+class QuoteCache:
+    """Latest Tick per symbol; one dict store per update, lookups are O(1)."""
+
+    def __init__(self):
+        self.quotes = {}
+
+    def update(self, tick):
+        # Ticks are never mutated after ingest, so readers on other threads can
+        # hold a reference without copying.
+        self.quotes[tick.symbol] = tick
+
+    def get(self, symbol):
+        return self.quotes.get(symbol)
+
+    def get_many(self, symbols):
+        """Bulk lookup; unknown symbols map to None."""
+        quotes = self.quotes
+        result = {}
+        for symbol in symbols:
+            tick = quotes.get(symbol)
+            result[symbol] = tick.as_dict() if tick is not None else None
+        return result
+
+    def snapshot(self):
+        return {symbol: tick.as_dict() for symbol, tick in list(self.quotes.items())}
+
+
+class QuoteRequestHandler(BaseHTTPRequestHandler):
+    """GET /quotes[?symbols=A,B], POST /quotes with a JSON list of symbols, GET /health."""
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        cache = self.server.cache
+        if url.path == "/health":
+            self.send_json({"symbols": len(cache.quotes)})
+        elif url.path == "/quotes":
+            symbols = parse_qs(url.query).get("symbols")
+            if symbols:
+                self.send_json(cache.get_many(",".join(symbols).split(",")))
+            else:
+                self.send_json(cache.snapshot())
+        else:
+            self.send_json({"error": f"unknown path {url.path}"}, status=404)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/quotes":
+            self.send_json({"error": f"unknown path {self.path}"}, status=404)
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            symbols = json.loads(self.rfile.read(length) or b"[]")
+        except ValueError:
+            self.send_json({"error": "body must be a JSON list of symbols"}, status=400)
+            return
+        if not isinstance(symbols, list):
+            self.send_json({"error": "body must be a JSON list of symbols"}, status=400)
+            return
+        self.send_json(self.server.cache.get_many(symbols))
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket peers have no (host, port) address.
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        self.socket.bind(self.server_address)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def serve_quotes(cache, port=None, host="127.0.0.1", unix_socket=None):
+    """Start the quote API on a background thread, over TCP or a Unix socket."""
+    if unix_socket:
+        server = UnixHTTPServer(unix_socket, QuoteRequestHandler)
+        where = unix_socket
+    else:
+        server = ThreadingHTTPServer((host, port), QuoteRequestHandler)
+        where = f"http://{host}:{server.server_port}"
+    server.daemon_threads = True
+    server.cache = cache
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving latest quotes on {where}")
+    return server
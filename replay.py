@@ -0,0 +1,423 @@
+import os
+import csv
+import json
+import sys
+import time
+import heapq
+import random
+import signal
+import argparse
+import threading
+import types
+import runpy
+import asyncio
+import zlib
+from collections import deque
+from sinks import INT_FIELDS
+from tick import DEPTH_LEVELS, TICK_FIELDS
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+
+def synthetic_messages(symbols, count, start_time=None, seed=1):
+    """Generate ``count`` SymbolUpdate messages round-robin over ``symbols`` as random walks."""
+    rng = random.Random(seed)
+    now = int(start_time or time.time())
+    state = {}
+    for symbol in symbols:
+        price = round(rng.uniform(50, 3000), 2)
+        state[symbol] = {"ltp": price, "vol": rng.randint(10_000, 1_000_000), "low": price, "high": price,
+                         "open": price, "prev_close": round(price * rng.uniform(0.97, 1.03), 2),
+                         "buy": rng.randint(10_000, 500_000), "sell": rng.randint(10_000, 500_000)}
+    for i in range(count):
+        symbol = symbols[i % len(symbols)]
+        s = state[symbol]
+        if rng.random() < 0.4:
+            s["ltp"] = round(max(0.05, s["ltp"] + rng.choice((-0.05, 0.05)) * rng.randint(1, 4)), 2)
+            s["low"] = min(s["low"], s["ltp"])
+            s["high"] = max(s["high"], s["ltp"])
+        qty = rng.randint(1, 100)
+        s["vol"] += qty
+        s["buy"] = max(0, s["buy"] + rng.randint(-50, 50))
+        s["sell"] = max(0, s["sell"] + rng.randint(-50, 50))
+        feed_time = now + i // max(1, len(symbols) * 10)
+        ltp = s["ltp"]
+        yield {"type": "sf", "symbol": symbol, "ltp": ltp, "vol_traded_today": s["vol"],
+               "last_traded_time": feed_time, "exch_feed_time": feed_time,
+               "bid_size": rng.randint(1, 2000), "ask_size": rng.randint(1, 2000),
+               "bid_price": round(ltp - 0.05, 2), "ask_price": round(ltp + 0.05, 2),
+               "last_traded_qty": qty, "tot_buy_qty": s["buy"], "tot_sell_qty": s["sell"],
+               "avg_trade_price": round((s["low"] + s["high"]) / 2, 2),
+               "low_price": s["low"], "high_price": s["high"],
+               "lower_ckt": round(s["prev_close"] * 0.9, 2), "upper_ckt": round(s["prev_close"] * 1.1, 2),
+               "open_price": s["open"], "prev_close_price": s["prev_close"],
+               "ch": round(ltp - s["prev_close"], 2), "chp": round((ltp - s["prev_close"]) * 100 / s["prev_close"], 2)}
+
+
+def synthetic_depth_messages(symbols, count, seed=1):
+    """Generate ``count`` five-level DepthUpdate messages round-robin over ``symbols``.
+
+    Each message moves the size of one or two levels and now and then shifts the
+    whole book a tick, so recordings have both small diffs and full rewrites.
+    """
+    rng = random.Random(seed)
+    books = {}
+    for symbol in symbols:
+        books[symbol] = {"mid": round(rng.uniform(50, 3000), 1),
+                         "sizes": [rng.randint(1, 5000) for _ in range(2 * DEPTH_LEVELS)],
+                         "orders": [rng.randint(1, 50) for _ in range(2 * DEPTH_LEVELS)]}
+    for i in range(count):
+        symbol = symbols[i % len(symbols)]
+        book = books[symbol]
+        if rng.random() < 0.05:
+            book["mid"] = round(max(1.0, book["mid"] + rng.choice((-0.05, 0.05))), 2)
+        for slot in rng.sample(range(2 * DEPTH_LEVELS), rng.randint(1, 2)):
+            book["sizes"][slot] = rng.randint(1, 5000)
+            book["orders"][slot] = rng.randint(1, 50)
+        message = {"type": "dp", "symbol": symbol}
+        for level in range(DEPTH_LEVELS):
+            bid, ask = level, DEPTH_LEVELS + level
+            message[f"bid_price{level + 1}"] = round(book["mid"] - 0.05 * (level + 1), 2)
+            message[f"ask_price{level + 1}"] = round(book["mid"] + 0.05 * (level + 1), 2)
+            message[f"bid_size{level + 1}"] = book["sizes"][bid]
+            message[f"ask_size{level + 1}"] = book["sizes"][ask]
+            message[f"bid_order{level + 1}"] = book["orders"][bid]
+            message[f"ask_order{level + 1}"] = book["orders"][ask]
+        yield message
+
+
+def csv_messages(paths):
+    """Replay recorder CSVs as messages, merged across files in exch_feed_time order."""
+    def read(path):
+        with open(path, newline='') as file:
+            for row in csv.DictReader(file):
+                if not row.get("symbol"):
+                    continue
+                message = {"type": "sf"}
+                for field in TICK_FIELDS:
+                    value = row.get(field)
+                    if value is None or value == "":
+                        message[field] = None
+                    elif field == "symbol":
+                        message[field] = value
+                    elif field in INT_FIELDS:
+                        message[field] = int(float(value))
+                    else:
+                        message[field] = float(value)
+                yield message
+
+    def feed_time(message):
+        return message.get("exch_feed_time") or 0
+
+    return heapq.merge(*(read(path) for path in paths), key=feed_time)
+
+
+class FakeFyersDataSocket:
+    """Local stand-in for ``fyers_apiv3.FyersWebsocket.data_ws.FyersDataSocket``.
+
+    Takes the same constructor arguments and, like the SDK, calls ``on_connect``
+    and then ``on_message(dict)`` from its own thread. Only subscribed symbols are
+    delivered. ``rate`` is ticks/sec over all symbols (0 = as fast as possible);
+    ``stamp_field`` overwrites that field with time.perf_counter() + stamp_offset
+    at send time so latency can be measured downstream. ``outage = (at, count)``
+    simulates a dropped connection after ``at`` ticks: ``on_close`` is called,
+    the next ``count`` ticks are lost and ``on_connect`` is called again.
+    """
+    source = None
+    rate = 0
+    outage = None
+    stamp_field = None
+    stamp_offset = 0.0
+    stop_when_done = False
+    instances = []
+
+    def __init__(self, access_token="", log_path="", litemode=False, write_to_file=False, reconnect=True,
+                 on_connect=None, on_close=None, on_error=None, on_message=None, reconnect_retry=5, **kwargs):
+        self.access_token = access_token
+        self.litemode = litemode
+        self.on_connect = on_connect
+        self.on_close = on_close
+        self.on_error = on_error
+        self.on_message = on_message
+        self.subscribed = set()
+        self.sent = 0
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+        self.thread = None
+        FakeFyersDataSocket.instances.append(self)
+
+    def running(self):
+        # The producers stop the SDK by assigning keep_running = False.
+        return self.__dict__.get("keep_running") is not False
+
+    def keep_running(self):
+        pass
+
+    def connect(self):
+        self.thread = threading.Thread(target=self.stream, name="fake-fyers-socket")
+        self.thread.start()
+
+    def subscribe(self, symbols, data_type="SymbolUpdate"):
+        self.subscribed.update(symbols)
+
+    def unsubscribe(self, symbols, data_type="SymbolUpdate"):
+        self.subscribed.difference_update(symbols)
+
+    def stream(self):
+        if self.on_connect:
+            self.on_connect()
+        interval = 1.0 / self.rate if self.rate else 0
+        stamp_field = self.stamp_field
+        stamp_offset = self.stamp_offset
+        on_message = self.on_message
+        subscribed = self.subscribed
+        self.started = time.perf_counter()
+        next_send = self.started
+        outage_at, outage_count = self.outage or (None, 0)
+        for message in self.source or ():
+            if not self.running():
+                break
+            if message.get("symbol") not in subscribed:
+                continue
+            if self.sent == outage_at:
+                if self.on_close:
+                    self.on_close({"code": 1006, "message": "replay outage"})
+                outage_at = None
+            if outage_at is None and outage_count:
+                outage_count -= 1
+                if not outage_count and self.on_connect:
+                    self.on_connect()
+                continue
+            if interval:
+                next_send += interval
+                delay = next_send - time.perf_counter()
+                if delay > 0.001:
+                    time.sleep(delay)
+            if stamp_field:
+                message[stamp_field] = time.perf_counter() + stamp_offset
+            on_message(message)
+            self.sent += 1
+        self.finished = time.perf_counter()
+        self.done.set()
+        if self.on_close:
+            self.on_close({"code": 1000, "message": "replay finished"})
+        if self.stop_when_done:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+
+class WebSocketStandIn:
+    """Local websocket server standing in for the data endpoint of ``wsfeed.WebSocketFeed``.
+
+    Runs on a thread and loop of its own. Once a client sends its first
+    subscribe request, the subscribed symbols' messages from ``source`` go out
+    as JSON arrays of up to ``frame_size`` messages, at ``rate`` ticks/sec
+    overall (0 = as fast as possible). ``sent``, ``done`` and the stamp settings
+    work as on FakeFyersDataSocket, so benchmark.py can drive either one.
+    """
+
+    def __init__(self, source, rate=0, host="127.0.0.1", port=0, frame_size=100, stamp_field=None,
+                 stamp_offset=0.0, stop_when_done=False):
+        if websockets is None:
+            raise RuntimeError("WebSocketStandIn requires websockets (pip install websockets)")
+        self.source = source
+        self.rate = rate
+        self.host = host
+        self.port = port
+        self.frame_size = frame_size
+        self.stamp_field = stamp_field
+        self.stamp_offset = stamp_offset
+        self.stop_when_done = stop_when_done
+        self.url = None
+        self.sent = 0
+        self.started = None
+        self.finished = None
+        self.ready = threading.Event()
+        self.done = threading.Event()
+
+    def start(self):
+        threading.Thread(target=asyncio.run, args=(self.serve(),), name="websocket-stand-in", daemon=True).start()
+        self.ready.wait()
+        return self
+
+    async def serve(self):
+        finished = asyncio.Event()
+        self.on_finished = finished.set
+        async with websockets.serve(self.handle, self.host, self.port, max_size=None) as server:
+            port = server.sockets[0].getsockname()[1]
+            self.url = f"ws://{self.host}:{port}"
+            self.ready.set()
+            await finished.wait()
+
+    async def handle(self, websocket, path=None):
+        subscribed = set()
+        subscribing = asyncio.Event()
+        requests = asyncio.create_task(self.read_requests(websocket, subscribed, subscribing))
+        # The initial subscribe arrives in batches; start once they stop coming.
+        await subscribing.wait()
+        while True:
+            subscribing.clear()
+            try:
+                await asyncio.wait_for(subscribing.wait(), 0.05)
+            except asyncio.TimeoutError:
+                break
+        try:
+            await self.stream(websocket, subscribed)
+            await websocket.close(1000, "replay finished")
+        except websockets.ConnectionClosed:
+            pass
+        requests.cancel()
+        self.finished = time.perf_counter()
+        self.done.set()
+        if self.stop_when_done:
+            self.on_finished()
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    async def read_requests(self, websocket, subscribed, subscribing):
+        async for raw in websocket:
+            request = json.loads(raw)
+            if request.get("type") == "subscribe":
+                subscribed.update(request["symbols"])
+                subscribing.set()
+            elif request.get("type") == "unsubscribe":
+                subscribed.difference_update(request["symbols"])
+
+    async def stream(self, websocket, subscribed):
+        interval = 1.0 / self.rate if self.rate else 0
+        frame = []
+        self.started = time.perf_counter()
+        next_send = self.started
+        for message in self.source or ():
+            if message.get("symbol") not in subscribed:
+                continue
+            if interval:
+                next_send += interval
+                delay = next_send - time.perf_counter()
+                if delay > 0.001:
+                    await self.send_frame(websocket, frame)
+                    await asyncio.sleep(delay)
+            frame.append(message)
+            if len(frame) >= self.frame_size:
+                await self.send_frame(websocket, frame)
+        await self.send_frame(websocket, frame)
+
+    async def send_frame(self, websocket, frame):
+        if not frame:
+            return
+        if self.stamp_field:
+            stamp = time.perf_counter() + self.stamp_offset
+            for message in frame:
+                message[self.stamp_field] = stamp
+        await websocket.send(json.dumps(frame))
+        self.sent += len(frame)
+        frame.clear()
+
+
+class StubFyersModel:
+    """Local stand-in for the ``fyersModel.FyersModel`` REST client's ``history`` call.
+
+    Returns deterministic 1-minute candles (the same symbol and minute always
+    give the same candle) and, like the API, a 429 error for calls beyond
+    ``per_second`` within a second.
+    """
+
+    def __init__(self, per_second=10, latency=0.05):
+        self.per_second = per_second
+        self.latency = latency
+        self.calls = deque()
+        self.lock = threading.Lock()
+        self.requests = []
+
+    def history(self, data):
+        with self.lock:
+            now = time.monotonic()
+            while self.calls and now - self.calls[0] >= 1:
+                self.calls.popleft()
+            if len(self.calls) >= self.per_second:
+                return {"s": "error", "code": 429, "message": "request limit reached"}
+            self.calls.append(now)
+            self.requests.append(dict(data))
+        time.sleep(self.latency)
+        symbol = data["symbol"]
+        first = int(data["range_from"]) // 60 * 60
+        last = int(data["range_to"])
+        candles = []
+        for start in range(first, last + 1, 60):
+            rng = random.Random(zlib.crc32(f"{symbol}:{start}".encode()))
+            open_ = round(rng.uniform(50, 3000), 2)
+            close = round(open_ * rng.uniform(0.99, 1.01), 2)
+            candles.append([start, open_, round(max(open_, close) * 1.002, 2), round(min(open_, close) * 0.998, 2),
+                            close, rng.randint(1, 50_000)])
+        return {"s": "ok", "code": 200, "candles": candles}
+
+
+def install():
+    """Make ``from fyers_apiv3.FyersWebsocket import data_ws`` resolve to the fake socket."""
+    package = sys.modules.get("fyers_apiv3") or types.ModuleType("fyers_apiv3")
+    websocket = types.ModuleType("fyers_apiv3.FyersWebsocket")
+    data_ws = types.ModuleType("fyers_apiv3.FyersWebsocket.data_ws")
+    data_ws.FyersDataSocket = FakeFyersDataSocket
+    websocket.data_ws = data_ws
+    package.FyersWebsocket = websocket
+    sys.modules["fyers_apiv3"] = package
+    sys.modules["fyers_apiv3.FyersWebsocket"] = websocket
+    sys.modules["fyers_apiv3.FyersWebsocket.data_ws"] = data_ws
+    return FakeFyersDataSocket
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run a producer script against a local replay instead of the Fyers socket",
+        epilog="Arguments after -- are passed to the producer, e.g. "
+               "replay.py main-producerv2.py --synthetic 50 -- --sink delta")
+    parser.add_argument("producer", help="Producer script, e.g. main-producerv2.py")
+    parser.add_argument("--csv", nargs="+", help="Plain recorder CSVs (--sink csv) to replay")
+    parser.add_argument("--synthetic", type=int, default=0, help="Number of synthetic symbols")
+    parser.add_argument("--ticks", type=int, default=100_000, help="Synthetic ticks to send")
+    parser.add_argument("--depth", action="store_true", help="Send synthetic DepthUpdate messages (use --sink depth)")
+    parser.add_argument("--rate", type=float, default=1000, help="Ticks/sec, 0 for as fast as possible")
+    parser.add_argument("--websocket", action="store_true",
+                        help="Serve the replay from a local websocket server and pass --feed-url to the producer")
+    parser.add_argument("--outage", nargs=2, type=int, metavar=("AT", "COUNT"),
+                        help="Drop the connection after AT ticks and lose the next COUNT (not with --websocket)")
+    argv = sys.argv[1:]
+    producer_args = []
+    if "--" in argv:
+        producer_args = argv[argv.index("--") + 1:]
+        argv = argv[:argv.index("--")]
+    args = parser.parse_args(argv)
+
+    if args.csv:
+        symbols = set()
+        for path in args.csv:
+            with open(path, newline='') as file:
+                symbols.update(row["symbol"] for row in csv.DictReader(file) if row.get("symbol"))
+        symbols = sorted(symbols)
+        source = csv_messages(args.csv)
+    elif args.synthetic:
+        symbols = [f"NSE:SYN{i:04d}-EQ" for i in range(args.synthetic)]
+        source = (synthetic_depth_messages if args.depth else synthetic_messages)(symbols, args.ticks)
+    else:
+        parser.error("give --csv files or --synthetic N")
+
+    # Installed either way so the producer's SDK import resolves without the SDK.
+    fake = install()
+    if args.websocket:
+        server = WebSocketStandIn(source, rate=args.rate, stop_when_done=True).start()
+        producer_args += ["--feed-url", server.url]
+    else:
+        fake.source = source
+        fake.rate = args.rate
+        fake.outage = args.outage
+        fake.stop_when_done = True
+    if "--symbols" not in producer_args and os.path.basename(args.producer) == "main-producerv2.py":
+        producer_args += ["--symbols", ",".join(symbols)]
+    sys.argv = [args.producer] + producer_args
+    runpy.run_path(args.producer, run_name="__main__")
+
+
+if __name__ == "__main__":
+    main()
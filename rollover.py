@@ -0,0 +1,59 @@
+import os
+import gzip
+import time
+import queue
+import shutil
+import threading
+
+# NSE trades on Indian Standard Time (UTC+05:30, no DST); a session's files are
+# named after the IST calendar date whatever the host's timezone is.
+IST_OFFSET = 5 * 3600 + 30 * 60
+
+
+def session_date(now=None):
+    """IST date (YYYY-MM-DD) of the session ``now`` (epoch seconds) falls in."""
+    now = time.time() if now is None else now
+    return time.strftime('%Y-%m-%d', time.gmtime(now + IST_OFFSET))
+
+
+def seconds_to_rollover(now=None):
+    """Seconds until the next IST midnight."""
+    now = time.time() if now is None else now
+    return 86400 - (now + IST_OFFSET) % 86400
+
+
+class Compressor:
+    """Gzips finished files on a background thread, replacing each with ``<name>.gz``.
+
+    The archive is written under a temporary name and renamed into place before
+    the original is removed, so a crash leaves either the plain file or a
+    complete archive.
+    """
+
+    def __init__(self, level=6):
+        self.level = level
+        self.files = queue.SimpleQueue()
+        self.compressed = 0
+        threading.Thread(target=self.run, name="compressor", daemon=True).start()
+
+    def submit(self, path):
+        self.files.put(path)
+
+    def run(self):
+        while True:
+            path = self.files.get()
+            try:
+                self.compress(path)
+            except OSError as e:
+                print(f"Error compressing {path}: {e}")
+
+    def compress(self, path):
+        if not os.path.exists(path):
+            return
+        tmp_path = path + ".gz.tmp"
+        with open(path, 'rb') as source, gzip.open(tmp_path, 'wb', compresslevel=self.level) as target:
+            shutil.copyfileobj(source, target, 1024 * 1024)
+        os.replace(tmp_path, path + ".gz")
+        os.remove(path)
+        self.compressed += 1
+        print(f"Compressed {path}")
@@ -0,0 +1,645 @@
+import io
+import os
+import csv
+import math
+import time
+import zlib
+import struct
+from array import array
+from tick import DEPTH_LEVELS, TICK_FIELDS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+CSV_HEADER = list(TICK_FIELDS)
+
+# Column types for the typed sinks: prices are float64, volumes, quantities and
+# epoch timestamps are int64.
+FLOAT_FIELDS = ("ltp", "bid_price", "ask_price", "avg_trade_price", "low_price", "high_price",
+                "lower_ckt", "upper_ckt", "open_price", "prev_close_price", "ch", "chp")
+INT_FIELDS = ("vol_traded_today", "last_traded_time", "exch_feed_time", "bid_size", "ask_size",
+              "last_traded_qty", "tot_buy_qty", "tot_sell_qty")
+
+
+class CsvSink:
+    """Appends ticks to a per-symbol CSV through one long-lived file handle."""
+    extension = "csv"
+    compressible = True
+    header = CSV_HEADER
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.ensure_file_exists()
+        self.file = open(self.filename, 'a', newline='')
+        self.buffer = io.StringIO()
+        self.writer = csv.writer(self.buffer)
+
+    def ensure_file_exists(self):
+        path = os.getcwd()
+        full_path = os.path.join(path, self.filename)
+        if not os.path.exists(full_path):
+            with open(full_path, mode='w', newline='') as file:
+                writer = csv.writer(file)
+                writer.writerow(self.header)
+            print(f"Created file with headers: {full_path}")
+        else:
+            print(f"File already exists: {full_path}")
+
+    def write(self, tick):
+        self.writer.writerow(tick.as_row())
+
+    def staged_bytes(self):
+        return self.buffer.tell()
+
+    def flush(self, fsync=False):
+        """Hand the staged rows to the OS in a single write."""
+        if self.buffer.tell():
+            self.file.write(self.buffer.getvalue())
+            self.file.flush()
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        if fsync:
+            os.fsync(self.file.fileno())
+
+    def position(self):
+        """Size of what has been handed to the OS; ``rollback`` cuts the file back to it."""
+        return os.path.getsize(self.filename)
+
+    @classmethod
+    def rollback(cls, filename, position):
+        if os.path.exists(filename) and os.path.getsize(filename) > position:
+            os.truncate(filename, position)
+
+    def close(self):
+        self.flush(fsync=True)
+        self.file.close()
+
+
+# Fields that stay fixed for a symbol through the day; the delta sink writes
+# them once (and again only if they change) instead of on every row.
+STATIC_FIELDS = ("lower_ckt", "upper_ckt", "open_price", "prev_close_price")
+DELTA_FIELDS = tuple(field for field in CSV_HEADER if field != "symbol" and field not in STATIC_FIELDS)
+DELTA_COLUMNS = [CSV_HEADER.index(field) for field in DELTA_FIELDS]
+STATIC_COLUMNS = [CSV_HEADER.index(field) for field in STATIC_FIELDS]
+
+
+class DeltaCsvSink(CsvSink):
+    """Delta-encoded per-symbol CSV.
+
+    Rows start with a kind column:
+      S,symbol,lower_ckt,upper_ckt,open_price,prev_close_price -- static fields, on first tick and on change
+      K,<DELTA_FIELDS>  -- keyframe with every value, on open and every ``keyframe_every`` rows
+      D,<DELTA_FIELDS>  -- delta; an empty cell means "same as the previous row"
+    A field that goes missing in a delta row therefore reads back as its previous
+    value. ``read_delta_csv`` rebuilds full rows in CSV_HEADER order.
+    """
+    extension = "dcsv"
+    header = ["kind"] + list(DELTA_FIELDS)
+
+    def __init__(self, filename, keyframe_every=1000):
+        super().__init__(filename)
+        self.keyframe_every = keyframe_every
+        self.since_keyframe = 0
+        # A reopened file always resumes with fresh static and keyframe rows.
+        self.static = None
+        self.previous = None
+
+    def write(self, tick):
+        row = tick.as_row()
+        static = [row[i] for i in STATIC_COLUMNS]
+        if static != self.static:
+            self.writer.writerow(["S", row[0]] + static)
+            self.static = static
+        values = [row[i] for i in DELTA_COLUMNS]
+        previous = self.previous
+        if previous is None or self.since_keyframe >= self.keyframe_every:
+            self.writer.writerow(["K"] + values)
+            self.since_keyframe = 0
+        else:
+            self.writer.writerow(["D"] + ["" if value == last else value for value, last in zip(values, previous)])
+            self.since_keyframe += 1
+        self.previous = values
+
+
+def read_delta_csv(path, opener=open):
+    """Yield the rows of a DeltaCsvSink file as full CSV_HEADER-ordered lists of strings."""
+    with opener(path, 'rt', newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        symbol = ""
+        static = [""] * len(STATIC_FIELDS)
+        current = None
+        for row in reader:
+            kind = row[0] if row else ""
+            if kind == "S":
+                symbol = row[1]
+                static = row[2:2 + len(STATIC_FIELDS)]
+                continue
+            if kind == "K":
+                current = row[1:]
+            elif kind == "D" and current is not None:
+                current = [value if value != "" else last for value, last in zip(row[1:], current)]
+            else:
+                continue
+            full = [""] * len(CSV_HEADER)
+            full[0] = symbol
+            for i, value in zip(DELTA_COLUMNS, current):
+                full[i] = value
+            for i, value in zip(STATIC_COLUMNS, static):
+                full[i] = value
+            yield full
+
+
+class ParquetSink:
+    """Buffers ticks in typed column arrays and writes compressed Parquet row groups.
+
+    Every closed row group is written as its own part file inside the
+    ``<SYMBOL>_data_<date>.parquet`` directory, so the dataset is always readable
+    (e.g. with ``pyarrow.dataset``) up to the last closed row group. Parts are
+    written to a temporary name, fsynced and renamed into place once complete,
+    so every part ``position`` counts is durable. Rows stay in memory until
+    their row group is due; ``due_in`` tells the recorder when to flush a quiet
+    symbol's rows.
+    """
+    extension = "parquet"
+    compressible = False
+
+    def __init__(self, filename, row_group_rows=50_000, row_group_bytes=8 * 1024 * 1024,
+                 row_group_ms=60_000, compression="zstd"):
+        if pa is None:
+            raise RuntimeError("ParquetSink requires pyarrow (pip install pyarrow)")
+        self.filename = filename
+        self.row_group_rows = row_group_rows
+        self.row_group_bytes = row_group_bytes
+        self.row_group_ms = row_group_ms
+        self.compression = compression
+        os.makedirs(self.filename, exist_ok=True)
+        self.part = len([name for name in os.listdir(self.filename) if name.endswith(".parquet")])
+        self.schema = pa.schema(
+            [("symbol", pa.string())]
+            + [(field, pa.int64() if field in INT_FIELDS else pa.float64()) for field in CSV_HEADER[1:]])
+        self.reset_columns()
+
+    def reset_columns(self):
+        self.symbols = []
+        self.columns = {field: array('q') for field in INT_FIELDS}
+        self.columns.update({field: array('d') for field in FLOAT_FIELDS})
+        self.opened_at = time.monotonic()
+
+    def write(self, tick):
+        if not self.symbols:
+            # Row groups age from their first row, not from the previous flush.
+            self.opened_at = time.monotonic()
+        self.symbols.append(tick.symbol)
+        for field in INT_FIELDS:
+            value = getattr(tick, field)
+            self.columns[field].append(int(value) if value is not None else 0)
+        for field in FLOAT_FIELDS:
+            value = getattr(tick, field)
+            self.columns[field].append(float(value) if value is not None else math.nan)
+
+    def staged_bytes(self):
+        # Row groups are governed by the sink's own thresholds, not the recorder's.
+        return 0
+
+    def row_group_due(self):
+        rows = len(self.symbols)
+        if rows == 0:
+            return False
+        if rows >= self.row_group_rows or rows * len(CSV_HEADER) * 8 >= self.row_group_bytes:
+            return True
+        return (time.monotonic() - self.opened_at) * 1000 >= self.row_group_ms
+
+    def due_in(self):
+        """Seconds until the held rows reach ``row_group_ms``, or None when nothing is held."""
+        if not self.symbols:
+            return None
+        return max(0, self.row_group_ms / 1000 - (time.monotonic() - self.opened_at))
+
+    def flush(self, fsync=False, force=False):
+        """Close the current row group once it reaches a size or age threshold.
+
+        Parts are fsynced whatever ``fsync`` says, so there is never an earlier
+        part left for a later ``flush(fsync=True)`` to make durable.
+        """
+        if not (self.row_group_due() or (force and self.symbols)):
+            return
+        arrays = [pa.array(self.symbols, type=pa.string())]
+        for field in CSV_HEADER[1:]:
+            arrays.append(pa.array(self.columns[field], type=self.schema.field(field).type))
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        final_path = os.path.join(self.filename, f"part-{self.part:05d}.parquet")
+        tmp_path = final_path + ".tmp"
+        with open(tmp_path, 'wb') as file:
+            pq.write_table(table, file, compression=self.compression, row_group_size=len(self.symbols))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, final_path)
+        self.part += 1
+        self.reset_columns()
+
+    def position(self):
+        """Number of parts written, or None while rows are still held in memory."""
+        return None if self.symbols else self.part
+
+    @classmethod
+    def rollback(cls, filename, position):
+        if not os.path.isdir(filename):
+            return
+        for name in os.listdir(filename):
+            if name.endswith(".tmp") or (name.startswith("part-") and int(name[5:10]) >= position):
+                os.remove(os.path.join(filename, name))
+
+    def close(self):
+        self.flush(fsync=True, force=True)
+
+
+def shard_for(symbol, shards):
+    """Stable shard number for a symbol (crc32, so every process agrees)."""
+    return zlib.crc32(symbol.encode()) % shards
+
+
+class ShardedLogSink:
+    """Append-only CSV log shared by every symbol that hashes to this shard.
+
+    Each flush groups the staged rows by symbol and appends one contiguous block
+    per symbol. A side ``.idx`` file records ``symbol,offset,length,rows`` for
+    every block, so reading one symbol back only touches its own blocks.
+    """
+    extension = "log"
+    compressible = False
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.index_filename = filename[:-len(self.extension)] + "idx"
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.filename, 'ab')
+        self.index = open(self.index_filename, 'a', newline='')
+        self.index_writer = csv.writer(self.index)
+        self.blocks = {}
+        self.staged = 0
+        # Characters staged over all blocks, kept up to date so staged_bytes is O(1) per tick.
+        self.staged_size = 0
+
+    def write(self, tick):
+        symbol = tick.symbol
+        block = self.blocks.get(symbol)
+        if block is None:
+            buffer = io.StringIO()
+            block = self.blocks[symbol] = [buffer, csv.writer(buffer), 0]
+        # writerow returns what the StringIO write returned: the characters written.
+        self.staged_size += block[1].writerow(tick.as_row())
+        block[2] += 1
+        self.staged += 1
+
+    def staged_bytes(self):
+        return self.staged_size
+
+    def flush(self, fsync=False):
+        """Append one block per symbol, then the matching index entries."""
+        if self.blocks:
+            offset = self.file.seek(0, os.SEEK_END)
+            chunks = []
+            entries = []
+            for symbol, (buffer, _, rows) in self.blocks.items():
+                chunk = buffer.getvalue().encode()
+                chunks.append(chunk)
+                entries.append((symbol, offset, len(chunk), rows))
+                offset += len(chunk)
+            self.file.write(b"".join(chunks))
+            self.file.flush()
+            if fsync:
+                os.fsync(self.file.fileno())
+            # The index is written after the data it points to, so a torn tail
+            # never references bytes that are not on disk.
+            self.index_writer.writerows(entries)
+            self.index.flush()
+            self.blocks = {}
+            self.staged = 0
+            self.staged_size = 0
+        if fsync:
+            os.fsync(self.index.fileno())
+
+    def position(self):
+        return os.path.getsize(self.filename)
+
+    @classmethod
+    def rollback(cls, filename, position):
+        """Cut the log back to ``position`` and drop index entries for blocks past it."""
+        if not os.path.exists(filename) or os.path.getsize(filename) <= position:
+            return
+        os.truncate(filename, position)
+        index_filename = filename[:-len(cls.extension)] + "idx"
+        if not os.path.exists(index_filename):
+            return
+        with open(index_filename, newline='') as index:
+            entries = [entry for entry in csv.reader(index)
+                       if len(entry) == 4 and int(entry[1]) + int(entry[2]) <= position]
+        with open(index_filename + ".tmp", 'w', newline='') as index:
+            csv.writer(index).writerows(entries)
+        os.replace(index_filename + ".tmp", index_filename)
+
+    def close(self):
+        self.flush(fsync=True)
+        self.file.close()
+        self.index.close()
+
+
+def sharded_log_path(directory, shard):
+    return os.path.join(directory, f"shard-{shard:02d}.{ShardedLogSink.extension}")
+
+
+def read_sharded_symbol(directory, symbol, shards):
+    """Yield one symbol's rows (as CSV field lists) from a sharded log directory."""
+    log_path = sharded_log_path(directory, shard_for(symbol, shards))
+    index_path = log_path[:-len(ShardedLogSink.extension)] + "idx"
+    if not os.path.exists(index_path):
+        return
+    with open(index_path, newline='') as index, open(log_path, 'rb') as log:
+        for entry in csv.reader(index):
+            if len(entry) != 4 or entry[0] != symbol:
+                continue
+            log.seek(int(entry[1]))
+            chunk = log.read(int(entry[2])).decode()
+            yield from csv.reader(io.StringIO(chunk))
+
+
+# Fixed-width binary layout shared with tickstore.py: a 64 byte header
+# (magic, record size, index stride, symbol) followed by little-endian records
+# of int64 fields (exch_feed_time first) then float64 fields.
+BINARY_MAGIC = b"NSETICK1"
+BINARY_HEADER = struct.Struct("<8sII48s")
+BINARY_FIELDS = ("exch_feed_time",) + tuple(field for field in INT_FIELDS if field != "exch_feed_time") + FLOAT_FIELDS
+BINARY_RECORD = struct.Struct("<" + "q" * len(INT_FIELDS) + "d" * len(FLOAT_FIELDS))
+BINARY_INDEX = struct.Struct("<qq")
+
+
+def binary_values(tick):
+    """Tick fields in BINARY_FIELDS order; missing ints become 0 and missing floats NaN."""
+    values = []
+    for field in BINARY_FIELDS[:len(INT_FIELDS)]:
+        value = getattr(tick, field)
+        values.append(int(value) if value is not None else 0)
+    for field in FLOAT_FIELDS:
+        value = getattr(tick, field)
+        values.append(float(value) if value is not None else math.nan)
+    return values
+
+
+class IndexedBinarySink:
+    """Base for sinks that append binary records to a data file plus a sparse index file beside it.
+
+    Subclasses stage records in ``buffer`` and index entries in
+    ``index_buffer``; ``flush`` writes the data before the index, so a crash
+    never leaves an index entry pointing past the data on disk.
+    """
+    extension = None
+    index_extension = None
+    compressible = False
+
+    @classmethod
+    def index_path(cls, filename):
+        return filename[:-len(cls.extension)] + cls.index_extension
+
+    def open_files(self):
+        self.file = open(self.filename, 'ab')
+        self.index = open(self.index_filename, 'ab')
+        self.buffer = bytearray()
+        self.index_buffer = bytearray()
+
+    def staged_bytes(self):
+        return len(self.buffer)
+
+    def flush(self, fsync=False):
+        if self.buffer:
+            self.file.write(self.buffer)
+            self.file.flush()
+            self.buffer = bytearray()
+        if fsync:
+            os.fsync(self.file.fileno())
+        if self.index_buffer:
+            self.index.write(self.index_buffer)
+            self.index.flush()
+            self.index_buffer = bytearray()
+        if fsync:
+            os.fsync(self.index.fileno())
+
+    def position(self):
+        return os.path.getsize(self.filename)
+
+    def close(self):
+        self.flush(fsync=True)
+        self.file.close()
+        self.index.close()
+
+
+class BinaryTickSink(IndexedBinarySink):
+    """Appends fixed-width binary records for one symbol, for mmap range reads via tickstore.py.
+
+    Every ``index_every``-th record also appends (exch_feed_time, record number)
+    to a sparse ``.tidx`` file next to the data.
+    """
+    extension = "ticks"
+    index_extension = "tidx"
+
+    def __init__(self, filename, index_every=256):
+        self.filename = filename
+        self.index_filename = self.index_path(filename)
+        self.index_every = index_every
+        size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        if size < BINARY_HEADER.size:
+            self.header_written = False
+            self.count = 0
+            aligned = 0
+        else:
+            self.header_written = True
+            self.count = (size - BINARY_HEADER.size) // BINARY_RECORD.size
+            aligned = BINARY_HEADER.size + self.count * BINARY_RECORD.size
+        if size != aligned:
+            # Drop a torn record left by a crash so new records stay aligned.
+            os.truncate(self.filename, aligned)
+        self.open_files()
+        self.pack = BINARY_RECORD.pack
+
+    def write(self, tick):
+        if not self.header_written:
+            symbol = (tick.symbol or "").encode()[:48]
+            self.file.write(BINARY_HEADER.pack(BINARY_MAGIC, BINARY_RECORD.size, self.index_every, symbol))
+            self.header_written = True
+        values = binary_values(tick)
+        if self.count % self.index_every == 0:
+            self.index_buffer += BINARY_INDEX.pack(values[0], self.count)
+        self.buffer += self.pack(*values)
+        self.count += 1
+
+    @classmethod
+    def rollback(cls, filename, position):
+        """Cut the file back to ``position`` and drop index entries for records past it."""
+        if not os.path.exists(filename) or os.path.getsize(filename) <= position:
+            return
+        os.truncate(filename, position)
+        count = max(0, (position - BINARY_HEADER.size) // BINARY_RECORD.size)
+        index_filename = cls.index_path(filename)
+        if not os.path.exists(index_filename):
+            return
+        with open(index_filename, 'rb') as index:
+            data = index.read()
+        # Entries are appended in record order, so the ones to keep are a prefix.
+        keep = 0
+        for _, record in BINARY_INDEX.iter_unpack(data[:len(data) - len(data) % BINARY_INDEX.size]):
+            if record >= count:
+                break
+            keep += 1
+        os.truncate(index_filename, keep * BINARY_INDEX.size)
+
+
+# Depth files: DEPTH_HEADER (magic, levels per side, symbol), then records of
+# DEPTH_RECORD (kind, receive time in microseconds, entry count) each followed
+# by that many DEPTH_ENTRY (book slot, price, size, orders). A snapshot lists
+# every slot, a diff only the slots that changed since the previous record.
+DEPTH_MAGIC = b"NSEDEP01"
+DEPTH_HEADER = struct.Struct("<8sI48s")
+DEPTH_RECORD = struct.Struct("<BqB")
+DEPTH_ENTRY = struct.Struct("<Bdqi")
+DEPTH_INDEX = struct.Struct("<qq")
+DEPTH_SNAPSHOT = 1
+DEPTH_DIFF = 2
+
+
+def read_depth_index(index_filename):
+    """(time, file offset) of every snapshot, oldest first."""
+    if not os.path.exists(index_filename):
+        return []
+    with open(index_filename, 'rb') as index:
+        data = index.read()
+    return list(DEPTH_INDEX.iter_unpack(data[:len(data) - len(data) % DEPTH_INDEX.size]))
+
+
+def depth_records(data, offset):
+    """Yield (kind, time, entries, end offset) from ``offset`` until the data ends or a record is torn."""
+    while offset + DEPTH_RECORD.size <= len(data):
+        kind, time_us, count = DEPTH_RECORD.unpack_from(data, offset)
+        end = offset + DEPTH_RECORD.size + count * DEPTH_ENTRY.size
+        if kind not in (DEPTH_SNAPSHOT, DEPTH_DIFF) or end > len(data):
+            return
+        entries = [DEPTH_ENTRY.unpack_from(data, offset + DEPTH_RECORD.size + i * DEPTH_ENTRY.size)
+                   for i in range(count)]
+        yield kind, time_us, entries, end
+        offset = end
+
+
+class DepthSink(IndexedBinarySink):
+    """Keeps a symbol's five-level book and records it as periodic snapshots plus level diffs.
+
+    Each update only writes the slots it changed. A full snapshot is written
+    first thing after (re)opening the file, then after every ``snapshot_every``
+    diffs or ``snapshot_seconds``, and its (time, offset) goes to a ``.didx``
+    index so tickstore.DepthReader can rebuild the book at any time by seeking
+    to the snapshot before it and replaying a bounded run of diffs.
+    """
+    extension = "depth"
+    index_extension = "didx"
+
+    def __init__(self, filename, snapshot_every=500, snapshot_seconds=60):
+        self.filename = filename
+        self.index_filename = self.index_path(filename)
+        self.snapshot_every = snapshot_every
+        self.snapshot_us = int(snapshot_seconds * 1_000_000)
+        self.book = [(math.nan, 0, 0)] * (2 * DEPTH_LEVELS)
+        size = os.path.getsize(self.filename) if os.path.exists(self.filename) else 0
+        end = self.resume(size) if size >= DEPTH_HEADER.size else 0
+        # Drop a torn record (and index entries past it) left by a crash.
+        self.rollback(self.filename, end)
+        self.header_written = end > 0
+        self.offset = end
+        self.open_files()
+        # None until the first snapshot of this session is written.
+        self.since_snapshot = None
+        self.snapshot_time = 0
+
+    def resume(self, size):
+        """Restore the book from a reopened file; returns the end of its last complete record.
+
+        Only the records from the last indexed snapshot on are read.
+        """
+        start = DEPTH_HEADER.size
+        for _, offset in read_depth_index(self.index_filename):
+            if offset < size:
+                start = offset
+        with open(self.filename, 'rb') as file:
+            file.seek(start)
+            data = file.read()
+        end = 0
+        for _, _, entries, end in depth_records(data, 0):
+            for slot, *level in entries:
+                self.book[slot] = tuple(level)
+        return start + end
+
+    def write(self, update):
+        if not self.header_written:
+            symbol = (update.symbol or "").encode()[:48]
+            self.buffer += DEPTH_HEADER.pack(DEPTH_MAGIC, DEPTH_LEVELS, symbol)
+            self.offset += DEPTH_HEADER.size
+            self.header_written = True
+        book = self.book
+        changed = []
+        for slot, (price, size, orders) in enumerate(update.levels):
+            old = book[slot]
+            new = (old[0] if price is None else float(price), old[1] if size is None else int(size),
+                   old[2] if orders is None else int(orders))
+            if new != old:
+                book[slot] = new
+                changed.append(slot)
+        if (self.since_snapshot is None or self.since_snapshot >= self.snapshot_every
+                or update.time - self.snapshot_time >= self.snapshot_us):
+            self.index_buffer += DEPTH_INDEX.pack(update.time, self.offset)
+            self.append(DEPTH_SNAPSHOT, update.time, range(len(book)))
+            self.since_snapshot = 0
+            self.snapshot_time = update.time
+        elif changed:
+            self.append(DEPTH_DIFF, update.time, changed)
+            self.since_snapshot += 1
+
+    def append(self, kind, time_us, slots):
+        record = bytearray(DEPTH_RECORD.pack(kind, time_us, len(slots)))
+        for slot in slots:
+            record += DEPTH_ENTRY.pack(slot, *self.book[slot])
+        self.buffer += record
+        self.offset += len(record)
+
+    @classmethod
+    def rollback(cls, filename, position):
+        """Cut the file back to ``position`` and drop index entries for snapshots past it."""
+        if os.path.exists(filename) and os.path.getsize(filename) > position:
+            os.truncate(filename, position)
+        index_filename = cls.index_path(filename)
+        if os.path.exists(index_filename):
+            keep = sum(1 for _, offset in read_depth_index(index_filename) if offset < position)
+            os.truncate(index_filename, keep * DEPTH_INDEX.size)
+
+
+SINKS = {"csv": CsvSink, "delta": DeltaCsvSink, "parquet": ParquetSink, "sharded": ShardedLogSink,
+         "binary": BinaryTickSink, "depth": DepthSink}
+
+
+def sink_class_for(filename):
+    """Sink class that writes files with this name's extension."""
+    extension = os.path.splitext(filename)[1][1:]
+    for sink_class in SINKS.values():
+        if sink_class.extension == extension:
+            return sink_class
+    raise ValueError(f"No sink writes .{extension} files")
+
+
+def make_sink(kind, filename, **options):
+    """Create a sink by name; ``filename`` is given without extension."""
+    if kind not in SINKS:
+        raise ValueError(f"Unknown sink type: {kind}")
+    sink_class = SINKS[kind]
+    return sink_class(f"{filename}.{sink_class.extension}", **options)
@@ -0,0 +1,202 @@
+import os
+import json
+import socketserver
+import threading
+import time
+
+# The Fyers data socket accepts at most 5000 symbols per connection.
+MAX_SYMBOLS = 5000
+
+
+def read_symbols_file(path):
+    """Symbols from a file, one per line or comma separated; ``#`` starts a comment line."""
+    symbols = []
+    with open(path) as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                symbols.extend(symbol.strip().upper() for symbol in line.split(",") if symbol.strip())
+    return list(dict.fromkeys(symbols))
+
+
+def batches(symbols, size):
+    for i in range(0, len(symbols), size):
+        yield symbols[i:i + size]
+
+
+class SubscriptionManager:
+    """Owns the set of subscribed symbols for one data socket.
+
+    ``active`` is an insertion-ordered dict, so membership tests on the tick path
+    and removals are O(1). ``add``/``remove`` only record the request (the last
+    request for a symbol wins); a background thread waits ``interval`` seconds
+    to coalesce a burst and then applies it as batched ``unsubscribe`` and
+    ``subscribe`` calls of at most ``batch_size`` symbols, never letting the
+    connection exceed ``max_symbols``. ``on_removed(symbols)`` is called after
+    symbols are unsubscribed so their recorders can be closed.
+    """
+
+    def __init__(self, symbols=(), data_type="SymbolUpdate", max_symbols=MAX_SYMBOLS, batch_size=100,
+                 interval=0.2, on_removed=None):
+        self.data_type = data_type
+        self.max_symbols = max_symbols
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_removed = on_removed
+        self.active = {}
+        self.pending = {}
+        self.rejected = 0
+        self.socket = None
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+        self.reset(symbols)
+
+    def reset(self, symbols):
+        """Replace the active set outright; only meant for before the socket connects."""
+        symbols = list(dict.fromkeys(symbol.upper() for symbol in symbols))
+        if len(symbols) > self.max_symbols:
+            print(f"Only subscribing the first {self.max_symbols} of {len(symbols)} symbols")
+            self.rejected += len(symbols) - self.max_symbols
+        self.active = dict.fromkeys(symbols[:self.max_symbols])
+
+    def request(self, symbols, add):
+        with self.lock:
+            for symbol in symbols:
+                self.pending[symbol.upper()] = add
+        self.wakeup.set()
+
+    def add(self, symbols):
+        self.request(symbols, True)
+
+    def remove(self, symbols):
+        self.request(symbols, False)
+
+    def replace(self, symbols):
+        """Converge on exactly ``symbols``: add the missing ones, remove the rest."""
+        wanted = dict.fromkeys(symbol.upper() for symbol in symbols)
+        with self.lock:
+            for symbol in list(self.active):
+                if symbol not in wanted:
+                    self.pending[symbol] = False
+            for symbol in wanted:
+                self.pending[symbol] = True
+        self.wakeup.set()
+
+    def attach(self, socket):
+        """Subscribe the whole active set on a (re)connected socket."""
+        self.socket = socket
+        for chunk in batches(list(self.active), self.batch_size):
+            socket.subscribe(symbols=chunk, data_type=self.data_type)
+
+    def apply(self):
+        """Apply the pending requests; returns (added, removed)."""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        active = self.active
+        added = [symbol for symbol, add in pending.items() if add and symbol not in active]
+        removed = [symbol for symbol, add in pending.items() if not add and symbol in active]
+        room = self.max_symbols - len(active) + len(removed)
+        if len(added) > room:
+            print(f"Symbol limit {self.max_symbols} reached, not subscribing {len(added) - room} symbols")
+            self.rejected += len(added) - room
+            added = added[:room]
+        socket = self.socket
+        for chunk in batches(removed, self.batch_size):
+            if socket:
+                socket.unsubscribe(symbols=chunk, data_type=self.data_type)
+            for symbol in chunk:
+                del active[symbol]
+        for chunk in batches(added, self.batch_size):
+            # Activate first so the first ticks after subscribing are not filtered out.
+            active.update(dict.fromkeys(chunk))
+            if socket:
+                socket.subscribe(symbols=chunk, data_type=self.data_type)
+        if removed and self.on_removed:
+            self.on_removed(removed)
+        if added or removed:
+            print(f"Subscribed {len(added)} and unsubscribed {len(removed)} symbols, {len(active)} active")
+        return added, removed
+
+    def run(self):
+        while not self.stopped:
+            self.wakeup.wait()
+            if self.stopped:
+                break
+            # Give a burst of requests time to arrive so it goes out as one batch.
+            self.wakeup.clear()
+            time.sleep(self.interval)
+            try:
+                self.apply()
+            except Exception as e:
+                print(f"Error applying subscription changes: {e}")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="subscriptions", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+
+    def watch(self, path, interval=1.0):
+        """Poll a symbols file and converge on its contents whenever it changes."""
+        def poll():
+            last = None
+            while not self.stopped:
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                    if mtime != last:
+                        last = mtime
+                        self.replace(read_symbols_file(path))
+                except OSError as e:
+                    print(f"Error reading symbols file {path}: {e}")
+                time.sleep(interval)
+        threading.Thread(target=poll, name="symbols-watch", daemon=True).start()
+
+
+class ControlRequestHandler(socketserver.StreamRequestHandler):
+    """One command per line, one JSON reply per line:
+
+      add SYM[,SYM...]     remove SYM[,SYM...]     set SYM[,SYM...]     list
+    """
+
+    def handle(self):
+        manager = self.server.manager
+        for line in self.rfile:
+            command, _, argument = line.decode().strip().partition(" ")
+            symbols = [symbol.strip() for symbol in argument.split(",") if symbol.strip()]
+            if command == "add":
+                manager.add(symbols)
+                reply = {"queued": len(symbols)}
+            elif command == "remove":
+                manager.remove(symbols)
+                reply = {"queued": len(symbols)}
+            elif command == "set":
+                manager.replace(symbols)
+                reply = {"queued": len(symbols)}
+            elif command == "list":
+                reply = {"symbols": list(manager.active), "pending": len(manager.pending),
+                         "rejected": manager.rejected}
+            else:
+                reply = {"error": f"unknown command {command!r}"}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+
+class ControlServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+
+
+def serve_control(manager, path):
+    """Accept subscription commands on a Unix socket, on a background thread."""
+    server = ControlServer(path, ControlRequestHandler)
+    server.manager = manager
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Accepting subscription commands on {path}")
+    return server
@@ -0,0 +1,233 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+from sinks import SINKS, shard_for
+
+PRODUCER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main-producerv2.py")
+
+
+class Worker:
+    def __init__(self, worker_id, symbols):
+        self.worker_id = worker_id
+        self.symbols = symbols
+        self.process = None
+        self.restarts = 0
+        self.restart_times = []
+        self.started_at = None
+        self.last_received = None
+        self.last_time = None
+        self.rate = 0.0
+
+
+class Supervisor:
+    """Runs main-producerv2.py as K worker processes, each with its own socket and recorders.
+
+    The symbol universe is split by crc32 so a symbol always lands on the same
+    worker. A worker that exits (or stops updating its status file) is restarted;
+    once it has needed more than max_restarts restarts within restart_window
+    seconds its symbols are spread over the surviving workers. Restarts older
+    than the window are forgotten, so a worker that crashes once a day is never
+    retired for it. Each worker watches its own symbols file, so the survivors pick up
+    their enlarged lists without a restart.
+    """
+
+    def __init__(self, symbols, workers=4, sink="csv", shards=8, status_dir="status",
+                 status_interval=5, max_restarts=3, restart_window=600):
+        self.sink = sink
+        self.shards = shards
+        self.status_dir = status_dir
+        self.status_interval = status_interval
+        self.stale_after = status_interval * 4
+        self.max_restarts = max_restarts
+        self.restart_window = restart_window
+        self.is_shutting_down = False
+        os.makedirs(self.status_dir, exist_ok=True)
+        self.workers = {}
+        for worker_id, worker_symbols in self.partition(symbols, list(range(workers))).items():
+            self.workers[worker_id] = Worker(worker_id, worker_symbols)
+
+    @staticmethod
+    def partition(symbols, worker_ids):
+        assignment = {worker_id: [] for worker_id in worker_ids}
+        for symbol in symbols:
+            assignment[worker_ids[shard_for(symbol, len(worker_ids))]].append(symbol)
+        return assignment
+
+    def status_path(self, worker):
+        return os.path.join(self.status_dir, f"worker-{worker.worker_id}.json")
+
+    def symbols_path(self, worker):
+        return os.path.join(self.status_dir, f"worker-{worker.worker_id}.symbols")
+
+    def write_symbols(self, worker):
+        tmp_path = self.symbols_path(worker) + ".tmp"
+        with open(tmp_path, 'w') as file:
+            file.write("\n".join(worker.symbols) + "\n")
+        os.replace(tmp_path, self.symbols_path(worker))
+
+    def spawn(self, worker):
+        if not worker.symbols:
+            print(f"Worker {worker.worker_id} has no symbols, not starting it")
+            return
+        self.write_symbols(worker)
+        command = [sys.executable, PRODUCER,
+                   "--symbols-file", self.symbols_path(worker),
+                   "--sink", self.sink,
+                   "--shards", str(self.shards),
+                   "--worker-id", str(worker.worker_id),
+                   "--status-file", self.status_path(worker),
+                   "--status-interval", str(self.status_interval)]
+        worker.process = subprocess.Popen(command, env=os.environ.copy())
+        worker.started_at = time.time()
+        worker.last_received = None
+        worker.rate = 0.0
+        print(f"Started worker {worker.worker_id} (pid {worker.process.pid}) with {len(worker.symbols)} symbols")
+
+    def stop(self, worker, timeout=30):
+        if worker.process and worker.process.poll() is None:
+            worker.process.send_signal(signal.SIGTERM)
+            try:
+                worker.process.wait(timeout)
+            except subprocess.TimeoutExpired:
+                worker.process.kill()
+                worker.process.wait()
+
+    def read_status(self, worker):
+        try:
+            with open(self.status_path(worker)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def check_workers(self):
+        for worker in list(self.workers.values()):
+            if worker.process is None:
+                continue
+            status = self.read_status(worker)
+            if worker.process.poll() is None:
+                last_seen = status["time"] if status and status.get("pid") == worker.process.pid else worker.started_at
+                if time.time() - last_seen > self.stale_after:
+                    print(f"Worker {worker.worker_id} stopped reporting, restarting it")
+                    self.stop(worker, timeout=5)
+                else:
+                    continue
+            print(f"Worker {worker.worker_id} exited with code {worker.process.returncode}")
+            now = time.time()
+            worker.restarts += 1
+            worker.restart_times = [t for t in worker.restart_times if now - t < self.restart_window] + [now]
+            if len(worker.restart_times) <= self.max_restarts:
+                self.spawn(worker)
+            else:
+                self.rebalance(worker)
+
+    def rebalance(self, dead):
+        """Retire a worker that keeps dying and hand its symbols to the survivors."""
+        del self.workers[dead.worker_id]
+        if not self.workers:
+            print("No workers left to take over symbols")
+            return
+        survivor_ids = sorted(self.workers)
+        orphans = self.partition(dead.symbols, survivor_ids)
+        print(f"Rebalancing {len(dead.symbols)} symbols from worker {dead.worker_id} over {survivor_ids}")
+        for worker_id, symbols in orphans.items():
+            if not symbols:
+                continue
+            worker = self.workers[worker_id]
+            worker.symbols = worker.symbols + symbols
+            if worker.process and worker.process.poll() is None:
+                self.write_symbols(worker)
+            else:
+                self.spawn(worker)
+
+    def aggregate(self):
+        """Collect worker health and throughput into status/supervisor.json."""
+        now = time.time()
+        summary = {"time": now, "workers": {}, "received": 0, "dropped": 0, "rate": 0.0}
+        for worker in self.workers.values():
+            status = self.read_status(worker)
+            alive = worker.process is not None and worker.process.poll() is None
+            entry = {"alive": alive, "symbols": len(worker.symbols), "restarts": worker.restarts}
+            if status and worker.process and status.get("pid") == worker.process.pid:
+                received = status["ingest"]["received"]
+                if worker.last_received is not None and status["time"] > worker.last_time:
+                    worker.rate = (received - worker.last_received) / (status["time"] - worker.last_time)
+                worker.last_received = received
+                worker.last_time = status["time"]
+                entry.update(status["ingest"], rate=round(worker.rate, 1))
+                summary["received"] += received
+                summary["dropped"] += status["ingest"]["dropped"]
+                summary["rate"] += worker.rate
+            summary["workers"][worker.worker_id] = entry
+        tmp_path = os.path.join(self.status_dir, "supervisor.json.tmp")
+        with open(tmp_path, 'w') as file:
+            json.dump(summary, file, indent=2)
+        os.replace(tmp_path, os.path.join(self.status_dir, "supervisor.json"))
+        alive = sum(1 for entry in summary["workers"].values() if entry["alive"])
+        print(f"{alive}/{len(self.workers)} workers alive, {summary['rate']:.0f} ticks/sec, "
+              f"{summary['received']} received, {summary['dropped']} dropped")
+
+    def shutdown(self):
+        self.is_shutting_down = True
+        print("Stopping workers...")
+        for worker in self.workers.values():
+            self.stop(worker)
+
+    def run(self):
+        for worker in self.workers.values():
+            self.spawn(worker)
+        while not self.is_shutting_down:
+            time.sleep(self.status_interval)
+            if self.is_shutting_down:
+                break
+            self.check_workers()
+            self.aggregate()
+
+
+def load_symbols(args):
+    symbols = []
+    if args.symbols:
+        symbols.extend(args.symbols.split(","))
+    if args.symbols_file:
+        with open(args.symbols_file) as file:
+            symbols.extend(line.strip() for line in file if line.strip() and not line.startswith("#"))
+    # Keep the first occurrence so the split is stable between runs.
+    return list(dict.fromkeys(symbol.upper() for symbol in symbols))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split a symbol universe across several producer processes")
+    parser.add_argument("--symbols", help="Comma separated symbols")
+    parser.add_argument("--symbols-file", help="File with one symbol per line")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--sink", default="csv", choices=list(SINKS))
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--status-dir", default="status")
+    parser.add_argument("--status-interval", type=float, default=5)
+    parser.add_argument("--max-restarts", type=int, default=3)
+    parser.add_argument("--restart-window", type=float, default=600,
+                        help="Seconds over which --max-restarts is counted")
+    args = parser.parse_args()
+
+    symbols = load_symbols(args)
+    if not symbols:
+        parser.error("no symbols given (use --symbols or --symbols-file)")
+    supervisor = Supervisor(symbols, workers=args.workers, sink=args.sink, shards=args.shards,
+                            status_dir=args.status_dir, status_interval=args.status_interval,
+                            max_restarts=args.max_restarts, restart_window=args.restart_window)
+
+    def signal_handler(sig, frame):
+        print(f"Signal {sig} received. Shutting down...")
+        supervisor.shutdown()
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGTERM, signal_handler)
+
+    supervisor.run()
+
+
+if __name__ == "__main__":
+    main()
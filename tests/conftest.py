@@ -0,0 +1,19 @@
+import os
+import sys
+import importlib.util
+import pytest
+
+# The modules live at the repository root rather than in a package.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+@pytest.fixture(scope="session")
+def producer():
+    """main-producerv2.py as a module, with replay's fake socket standing in for the Fyers SDK."""
+    import replay
+    replay.install()
+    spec = importlib.util.spec_from_file_location("main_producerv2", os.path.join(ROOT, "main-producerv2.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,75 @@
+import random
+
+from bars import BarAggregator
+from tick import Tick
+
+SYMBOL = "NSE:SYN0000-EQ"
+
+
+class RecordingSink:
+    def __init__(self):
+        self.bars = []
+
+    def write(self, symbol, interval, bar):
+        self.bars.append((interval, bar.start, bar.volume))
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def tick(feed_time, volume, price=100.0):
+    return Tick.from_message({"symbol": SYMBOL, "exch_feed_time": feed_time, "vol_traded_today": volume,
+                              "ltp": price})
+
+
+def volume_by_interval(sink):
+    totals = {}
+    for interval, _, volume in sink.bars:
+        totals[interval] = totals.get(interval, 0) + volume
+    return totals
+
+
+def test_late_tick_volume_goes_to_the_open_bar():
+    sink = RecordingSink()
+    bars = BarAggregator(sink, intervals=("1s",))
+    for t in (tick(1000, 100), tick(1001, 110), tick(1000, 130), tick(1001, 135)):
+        bars.update(t)
+    bars.close_all()
+    assert sink.bars == [("1s", 1000, 0), ("1s", 1001, 35)]
+    assert bars.late == 1
+
+
+def test_late_tick_after_close_is_carried_into_the_next_bar():
+    sink = RecordingSink()
+    bars = BarAggregator(sink, intervals=("1s",), grace=2)
+    bars.update(tick(1000, 100))
+    bars.update(tick(1000, 120))
+    bars.close_idle(now=1005)
+    bars.update(tick(1000, 150))
+    bars.update(tick(1006, 160))
+    bars.close_all()
+    assert sink.bars == [("1s", 1000, 20), ("1s", 1006, 40)]
+
+
+def test_bar_volumes_add_up_with_out_of_order_ticks():
+    rng = random.Random(7)
+    times = [36000 + second for second in range(600) for _ in range(rng.randint(0, 3))]
+    # Hold some feed times back by up to five seconds; the cumulative volume still grows in arrival order.
+    times.sort(key=lambda ts: ts + rng.choice((0, 0, 0, rng.uniform(0, 5))))
+    times.append(36600)
+    volume = 1000
+    sink = RecordingSink()
+    bars = BarAggregator(sink, intervals=("1s", "1m", "5m"), grace=1)
+    bars.update(tick(35999, volume))
+    for ts in times:
+        volume += rng.randint(1, 50)
+        bars.update(tick(ts, volume, 100 + rng.random()))
+        # A wall clock running ahead of the feed closes the open 1s bar now and then.
+        bars.close_idle(now=bars.feed_time + rng.choice((0, 0, 2)))
+    bars.close_all()
+    assert bars.late > 0
+    grown = volume - 1000
+    assert volume_by_interval(sink) == {"1s": grown, "1m": grown, "5m": grown}
@@ -0,0 +1,52 @@
+from gaps import Gap, GapTracker
+from tick import Tick
+
+SYMBOL = "NSE:SYN0000-EQ"
+
+
+class RecordingIndex:
+    def __init__(self):
+        self.gaps = []
+
+    def append(self, gap):
+        self.gaps.append(gap)
+
+
+def tick(feed_time, volume, qty):
+    return Tick.from_message({"symbol": SYMBOL, "exch_feed_time": feed_time, "vol_traded_today": volume,
+                              "last_traded_qty": qty})
+
+
+def observe(tracker, *ticks):
+    for t in ticks:
+        tracker.observe(t)
+    return tracker.index.gaps
+
+
+def test_first_trade_after_silence_is_not_a_gap():
+    tracker = GapTracker(RecordingIndex(), min_gap=60)
+    assert observe(tracker, tick(1000, 500, 5), tick(1300, 510, 10)) == []
+
+
+def test_untraded_volume_across_silence_is_a_gap():
+    tracker = GapTracker(RecordingIndex(), min_gap=60)
+    gaps = observe(tracker, tick(1000, 500, 5), tick(1300, 540, 10))
+    assert gaps == [Gap(SYMBOL, 1000, 1300, 40, "silence")]
+    assert tracker.detected == {"silence": 1}
+
+
+def test_short_pause_is_not_a_gap():
+    tracker = GapTracker(RecordingIndex(), min_gap=60)
+    assert observe(tracker, tick(1000, 500, 5), tick(1030, 540, 10)) == []
+
+
+def test_reconnect_uses_the_same_volume_check():
+    tracker = GapTracker(RecordingIndex(), min_gap=60)
+    observe(tracker, tick(1000, 500, 5))
+    tracker.disconnected(now=1001)
+    tracker.connected(now=1005)
+    assert observe(tracker, tick(1006, 510, 10)) == []
+    tracker.disconnected(now=1007)
+    tracker.connected(now=1010)
+    assert observe(tracker, tick(1011, 600, 10)) == [Gap(SYMBOL, 1006, 1011, 90, "reconnect")]
+    assert tracker.outages == [(1001, 1005), (1007, 1010)]
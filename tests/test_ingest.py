@@ -0,0 +1,53 @@
+import csv
+import time
+import asyncio
+import pytest
+from ingest import IngestRing
+from replay import synthetic_messages
+
+GOOD = "NSE:GOOD-EQ"
+# The recorder file for this symbol would need a BAD/ directory, so creating its sink fails.
+BAD = "NSE:BAD/X-EQ"
+
+
+def test_ring_keeps_consuming_after_a_handler_error():
+    ring = IngestRing(capacity=16, max_batch=4)
+    handled = []
+
+    def handler(batch, stamps):
+        if batch[0] == "boom":
+            raise RuntimeError("bad batch")
+        handled.extend(batch)
+
+    async def run():
+        consumer = asyncio.create_task(ring.run(handler))
+        for message in ["boom"] + list(range(12)):
+            ring.put(message)
+            await asyncio.sleep(0)
+        ring.close()
+        await consumer
+
+    asyncio.run(run())
+    assert ring.failed >= 1
+    assert handled[-1] == 11
+
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_dispatch_drops_bad_messages_and_records_the_rest(producer, tmp_path, monkeypatch, journal):
+    monkeypatch.chdir(tmp_path)
+    client = producer.FyersWebSocketClient("", symbols=[BAD, GOOD], journal_dir="journal" if journal else None,
+                                           compress=False)
+    bad = dict(next(synthetic_messages([BAD], 1)))
+    for message in [bad, "not a dict", [1, 2]] + list(synthetic_messages([GOOD], 200)):
+        client.onmessage_sync(message)
+    deadline = time.monotonic() + 10
+    while client.queued.get(GOOD, 0) < 200 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not client.ingest_task.done()
+    client.shutdown()
+
+    assert client.failed_symbols == {BAD: 1, None: 2}
+    assert client.dropped_counts()[(("symbol", BAD), ("reason", "error"))] == 1
+    filename, = [path for path in tmp_path.iterdir() if path.name.startswith("GOOD-EQ_data_")]
+    with open(filename, newline='') as file:
+        assert len(list(csv.reader(file))) == 201
@@ -0,0 +1,176 @@
+import os
+import asyncio
+from journal import JOURNAL_MAGIC, ROUTE, TICK, TickJournal, frame, read_frames
+from replay import synthetic_messages
+from sinks import CsvSink
+from tick import Tick
+
+SYMBOL = "NSE:SYN0000-EQ"
+
+
+def make_ticks(count):
+    return [Tick.from_message(message) for message in synthetic_messages([SYMBOL], count)]
+
+
+def rows(ticks):
+    return [tick.as_row() for tick in ticks]
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("wal-"))
+
+
+def crash(journal):
+    """Leave the journal's segments behind as a killed process would."""
+    journal.file.close()
+
+
+def test_frames_stop_at_torn_tail(tmp_path):
+    path = tmp_path / "wal-0000000000000001-0.log"
+    torn = frame(TICK, b"third")[:-2]
+    path.write_bytes(JOURNAL_MAGIC + frame(TICK, b"first") + frame(TICK, b"second") + torn)
+    assert [payload for _, payload in read_frames(path)] == [b"first", b"second"]
+
+
+def test_frames_stop_at_corrupt_frame(tmp_path):
+    path = tmp_path / "wal-0000000000000001-0.log"
+    corrupt = bytearray(frame(TICK, b"second"))
+    corrupt[-1] ^= 0xFF
+    path.write_bytes(JOURNAL_MAGIC + frame(TICK, b"first") + bytes(corrupt) + frame(TICK, b"third"))
+    assert [payload for _, payload in read_frames(path)] == [b"first"]
+
+
+def test_recovery_round_trip(tmp_path):
+    directory = str(tmp_path / "journal")
+    filename = str(tmp_path / "SYN0000_data_2026-10-15.csv")
+    ticks = make_ticks(10)
+    journal = TickJournal(directory)
+    sink = CsvSink(filename)
+    journal.route(SYMBOL, filename)
+    for tick in ticks[:6]:
+        journal.append(tick)
+        sink.write(tick)
+    sink.flush(fsync=True)
+    checkpointed = sink.position()
+    journal.checkpoint(filename, 6, checkpointed)
+    for tick in ticks[6:]:
+        journal.append(tick)
+    # Two rows past the checkpoint reach the file before the crash.
+    sink.write(ticks[6])
+    sink.write(ticks[7])
+    sink.flush()
+    asyncio.run(journal.commit())
+    crash(journal)
+
+    recovered = TickJournal(directory)
+    assert recovered.seq == 10
+    assert recovered.rollbacks == {filename: checkpointed}
+    assert [name for name, _ in recovered.recovered] == [filename] * 4
+    assert rows(tick for _, tick in recovered.recovered) == rows(ticks[6:])
+
+    CsvSink.rollback(filename, checkpointed)
+    assert os.path.getsize(filename) == checkpointed
+
+
+def test_recovery_keeps_missing_fields(tmp_path):
+    directory = str(tmp_path / "journal")
+    tick = make_ticks(1)[0]
+    tick.ltp = None
+    tick.bid_size = None
+    journal = TickJournal(directory)
+    journal.route(SYMBOL, "a.csv")
+    journal.append(tick)
+    asyncio.run(journal.commit())
+    crash(journal)
+
+    (_, recovered), = TickJournal(directory).recovered
+    assert recovered.as_row() == tick.as_row()
+
+
+def test_recovery_drops_torn_commit_tail(tmp_path):
+    directory = str(tmp_path / "journal")
+    ticks = make_ticks(4)
+    journal = TickJournal(directory)
+    journal.route(SYMBOL, "a.csv")
+    for tick in ticks:
+        journal.append(tick)
+    asyncio.run(journal.commit())
+    crash(journal)
+    path = os.path.join(directory, segments(directory)[-1])
+    os.truncate(path, os.path.getsize(path) - 3)
+
+    recovered = TickJournal(directory)
+    assert rows(tick for _, tick in recovered.recovered) == rows(ticks[:3])
+
+
+def test_checkpointed_ticks_are_not_recovered(tmp_path):
+    directory = str(tmp_path / "journal")
+    journal = TickJournal(directory)
+    journal.route(SYMBOL, "a.csv")
+    for tick in make_ticks(5):
+        journal.append(tick)
+    journal.checkpoint("a.csv", 5, 1234)
+    asyncio.run(journal.commit())
+    crash(journal)
+
+    recovered = TickJournal(directory)
+    assert recovered.recovered == []
+    assert recovered.rollbacks == {"a.csv": 1234}
+
+
+def test_prune_keeps_segments_until_checkpointed(tmp_path):
+    directory = str(tmp_path / "journal")
+    journal = TickJournal(directory, segment_bytes=1024)
+    journal.route(SYMBOL, "a.csv")
+
+    async def fill():
+        for tick in make_ticks(40):
+            journal.append(tick)
+            await journal.commit()
+
+    asyncio.run(fill())
+    assert len(segments(directory)) == len(journal.segments) > 2
+
+    async def checkpoint():
+        journal.checkpoint("a.csv", journal.seq, 0)
+        await journal.commit()
+        journal.prune()
+
+    asyncio.run(checkpoint())
+    assert segments(directory) == [os.path.basename(journal.segments[-1][1])]
+
+
+def test_close_removes_checkpointed_segments(tmp_path):
+    directory = str(tmp_path / "journal")
+    journal = TickJournal(directory)
+    journal.route(SYMBOL, "a.csv")
+    for tick in make_ticks(3):
+        journal.append(tick)
+    journal.checkpoint("a.csv", 3, 0)
+    journal.close()
+    assert segments(directory) == []
+
+
+def test_retire_keeps_sinks_with_uncheckpointed_ticks(tmp_path):
+    journal = TickJournal(str(tmp_path / "journal"))
+    journal.route(SYMBOL, "a.csv")
+    journal.append(make_ticks(1)[0])
+    journal.retire("a.csv")
+    assert "a.csv" in journal.last_seq
+    journal.checkpoint("a.csv", 1, 0)
+    journal.retire("a.csv")
+    assert "a.csv" not in journal.last_seq and "a.csv" not in journal.checkpoints
+
+
+def test_retire_drops_routes_from_new_segments(tmp_path):
+    journal = TickJournal(str(tmp_path / "journal"))
+    journal.route(SYMBOL, "a.csv")
+    journal.route("NSE:SYN0001-EQ", "a.csv")
+    journal.route("NSE:SYN0001-EQ", "b.csv")
+    journal.append(make_ticks(1)[0])
+    journal.checkpoint("a.csv", 1, 0)
+    journal.retire("a.csv")
+    assert journal.routes == {"NSE:SYN0001-EQ": "b.csv"}
+    journal.open_segment()
+    head = [payload for kind, payload in read_frames(journal.segments[-1][1]) if kind == ROUTE]
+    assert head == [b"NSE:SYN0001-EQ\0b.csv"]
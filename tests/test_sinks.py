@@ -0,0 +1,32 @@
+import io
+import csv
+from replay import synthetic_messages
+from sinks import DeltaCsvSink, read_delta_csv
+from tick import Tick
+
+SYMBOL = "NSE:SYN0000-EQ"
+
+
+def as_csv_strings(ticks):
+    """The rows a plain CsvSink would write for ``ticks``, read back as strings."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(tick.as_row() for tick in ticks)
+    buffer.seek(0)
+    return list(csv.reader(buffer))
+
+
+def test_delta_csv_round_trip(tmp_path):
+    messages = list(synthetic_messages([SYMBOL], 500, start_time=1_700_000_000))
+    # A circuit limit revision mid-session makes the sink write a second static row.
+    for message in messages[300:]:
+        message["upper_ckt"] = round(message["upper_ckt"] * 1.05, 2)
+    ticks = [Tick.from_message(message) for message in messages]
+    path = str(tmp_path / "SYN0000-EQ_data.dcsv")
+    sink = DeltaCsvSink(path, keyframe_every=64)
+    for tick in ticks:
+        sink.write(tick)
+    sink.close()
+    assert list(read_delta_csv(path)) == as_csv_strings(ticks)
+    with open(path) as file:
+        kinds = [line[0] for line in file.readlines()[1:]]
+    assert kinds.count("S") == 2 and kinds.count("K") == 8
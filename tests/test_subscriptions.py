@@ -0,0 +1,48 @@
+from subscriptions import SubscriptionManager
+
+
+class RecordingSocket:
+    def __init__(self):
+        self.calls = []
+
+    def subscribe(self, symbols, data_type):
+        self.calls.append(("subscribe", list(symbols)))
+
+    def unsubscribe(self, symbols, data_type):
+        self.calls.append(("unsubscribe", list(symbols)))
+
+
+def symbols(*numbers):
+    return [f"NSE:SYN{i:04d}-EQ" for i in numbers]
+
+
+def test_apply_batches_adds_and_removes():
+    removed = []
+    manager = SubscriptionManager(symbols(0, 1, 2, 3), batch_size=2, on_removed=removed.extend)
+    socket = RecordingSocket()
+    manager.attach(socket)
+    assert socket.calls == [("subscribe", symbols(0, 1)), ("subscribe", symbols(2, 3))]
+    socket.calls = []
+    # Already active, added twice (once in lower case), removed then re-added, and added then removed.
+    manager.add(symbols(0, 4, 5))
+    manager.add([symbol.lower() for symbol in symbols(4, 6)])
+    manager.remove(symbols(1, 2, 3, 7))
+    manager.add(symbols(3))
+    manager.add(symbols(8))
+    manager.remove(symbols(8))
+    assert manager.apply() == (symbols(4, 5, 6), symbols(1, 2))
+    assert socket.calls == [("unsubscribe", symbols(1, 2)), ("subscribe", symbols(4, 5)), ("subscribe", symbols(6))]
+    assert list(manager.active) == symbols(0, 3, 4, 5, 6)
+    assert removed == symbols(1, 2)
+    assert manager.apply() == ([], [])
+
+
+def test_apply_respects_the_symbol_limit():
+    manager = SubscriptionManager(symbols(0, 1), max_symbols=3)
+    socket = RecordingSocket()
+    manager.attach(socket)
+    manager.remove(symbols(0))
+    manager.add(symbols(2, 3, 4))
+    assert manager.apply() == (symbols(2, 3), symbols(0))
+    assert list(manager.active) == symbols(1, 2, 3)
+    assert manager.rejected == 1
@@ -0,0 +1,57 @@
+import pytest
+from sinks import DEPTH_HEADER, DEPTH_INDEX, DEPTH_SNAPSHOT, DepthSink, depth_records
+from tick import DEPTH_KEYS, DepthUpdate
+from tickstore import DepthReader
+
+SYMBOL = "NSE:SYN0000-EQ"
+
+
+def write_depth(path, updates, snapshot_every):
+    sink = DepthSink(str(path), snapshot_every=snapshot_every)
+    for second in range(updates):
+        message = {"symbol": SYMBOL}
+        for level, (price, size, orders) in enumerate(DEPTH_KEYS):
+            message[price] = 100 + level + second
+            message[size] = 10 * (level + 1)
+            message[orders] = 1
+        sink.write(DepthUpdate.from_message(message, 1000 + second))
+    sink.close()
+
+
+def records(path):
+    data = path.read_bytes()
+    offset = DEPTH_HEADER.size
+    for kind, time_us, _, end in depth_records(data, offset):
+        yield kind, time_us, offset
+        offset = end
+
+
+def rewrite_index(path, entries):
+    with open(DepthSink.index_path(str(path)), 'wb') as file:
+        for time_us, offset in entries:
+            file.write(DEPTH_INDEX.pack(time_us, offset))
+
+
+def test_index_entry_on_a_diff_skips_to_the_next_snapshot(tmp_path):
+    path = tmp_path / "book.depth"
+    write_depth(path, 12, snapshot_every=4)
+    reader = DepthReader(str(path))
+    expected = reader.book_at(1_011_000_000)
+    reader.close()
+    assert expected["time"] == 1_011_000_000
+    diff = next((time_us, offset) for kind, time_us, offset in records(path) if kind != DEPTH_SNAPSHOT)
+    rewrite_index(path, [diff])
+    reader = DepthReader(str(path))
+    assert reader.book_at(1_011_000_000) == expected
+    reader.close()
+
+
+def test_index_without_a_snapshot_before_the_time_raises(tmp_path):
+    path = tmp_path / "book.depth"
+    write_depth(path, 12, snapshot_every=100)
+    diffs = [(time_us, offset) for kind, time_us, offset in records(path) if kind != DEPTH_SNAPSHOT]
+    rewrite_index(path, [diffs[0]])
+    reader = DepthReader(str(path))
+    with pytest.raises(ValueError):
+        reader.book_at(1_011_000_000)
+    reader.close()
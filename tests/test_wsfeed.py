@@ -0,0 +1,83 @@
+import json
+import asyncio
+import pytest
+from ingest import IngestRing
+from replay import WebSocketStandIn, synthetic_messages
+from wsfeed import WebSocketFeed, decode
+
+pytest.importorskip("websockets")
+
+SYMBOLS = [f"NSE:SYN{i:04d}-EQ" for i in range(4)]
+
+
+class JunkFirstStandIn(WebSocketStandIn):
+    """Sends a frame that is not JSON and one with non-dict elements before the replay."""
+
+    async def stream(self, websocket, subscribed):
+        await websocket.send("[{\"symbol\": ")
+        await websocket.send(json.dumps([5, "not a message", {"symbol": "NSE:JUNK-EQ"}]))
+        await super().stream(websocket, subscribed)
+
+
+def feed_from_stand_in(messages, subscribe, capacity=65536, consume_delay=0, stand_in=WebSocketStandIn, **options):
+    """Run a WebSocketFeed against a WebSocketStandIn until the stand-in closes; returns what reached the ring."""
+    server = stand_in(iter(messages), **options).start()
+    ring = IngestRing(capacity=capacity, max_batch=min(capacity, 4096))
+    received = []
+    events = []
+
+    def handler(batch, stamps):
+        received.extend(batch)
+        if consume_delay:
+            return asyncio.sleep(consume_delay)
+
+    async def run():
+        feed = WebSocketFeed(server.url, ring, reconnect=False,
+                             on_connect=lambda: (events.append("connect"), feed.subscribe(subscribe)),
+                             on_close=lambda message: events.append(message["code"]))
+        consumer = asyncio.create_task(ring.run(handler))
+        await asyncio.wait_for(feed.run(), 30)
+        ring.close()
+        await consumer
+        return feed
+
+    feed = asyncio.run(run())
+    return feed, ring, received, events
+
+
+def test_decode_single_and_batched_frames():
+    assert decode('{"symbol": "NSE:A-EQ"}') == [{"symbol": "NSE:A-EQ"}]
+    assert decode('[{"symbol": "NSE:A-EQ"}, {"symbol": "NSE:B-EQ"}]') == [{"symbol": "NSE:A-EQ"},
+                                                                          {"symbol": "NSE:B-EQ"}]
+
+
+def test_feed_delivers_every_tick_in_order():
+    messages = list(synthetic_messages(SYMBOLS, 2000))
+    feed, ring, received, events = feed_from_stand_in(messages, SYMBOLS, frame_size=50)
+    assert received == messages
+    assert feed.frames == 40
+    assert events == ["connect", 1000]
+    assert ring.stats()["dropped"] == 0
+
+
+def test_feed_only_delivers_subscribed_symbols():
+    messages = list(synthetic_messages(SYMBOLS, 400))
+    _, _, received, _ = feed_from_stand_in(messages, SYMBOLS[:2])
+    assert received == [message for message in messages if message["symbol"] in SYMBOLS[:2]]
+
+
+def test_full_ring_pushes_back_instead_of_dropping():
+    messages = list(synthetic_messages(SYMBOLS, 3000))
+    _, ring, received, _ = feed_from_stand_in(messages, SYMBOLS, capacity=64, consume_delay=0.001, frame_size=200)
+    assert received == messages
+    assert ring.stats()["dropped"] == 0
+    assert ring.stats()["high_watermark"] == 64
+
+
+def test_bad_frames_are_skipped_and_counted():
+    messages = list(synthetic_messages(SYMBOLS, 400))
+    feed, _, received, events = feed_from_stand_in(messages, SYMBOLS, frame_size=50, stand_in=JunkFirstStandIn)
+    assert received == [{"symbol": "NSE:JUNK-EQ"}] + messages
+    assert feed.bad_frames == 3
+    assert feed.frames == 2 + 8
+    assert events == ["connect", 1000]
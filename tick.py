@@ -0,0 +1,115 @@
+TICK_FIELDS = ("symbol", "ltp", "vol_traded_today", "last_traded_time", "exch_feed_time",
+               "bid_size", "ask_size", "bid_price", "ask_price", "last_traded_qty",
+               "tot_buy_qty", "tot_sell_qty", "avg_trade_price", "low_price",
+               "high_price", "lower_ckt", "upper_ckt", "open_price", "prev_close_price",
+               "ch", "chp")
+
+
+class Tick:
+    """Fixed-schema SymbolUpdate record, built once at ingest and shared by every sink.
+
+    A slotted instance holds the 21 fields in about 200 bytes, against well over
+    a kilobyte for the decoded websocket dict it replaces.
+    """
+    __slots__ = TICK_FIELDS
+
+    @classmethod
+    def from_message(cls, message):
+        """Pull every field out of a websocket message in one pass; missing fields become None."""
+        tick = cls.__new__(cls)
+        get = message.get
+        tick.symbol = get("symbol")
+        tick.ltp = get("ltp")
+        tick.vol_traded_today = get("vol_traded_today")
+        tick.last_traded_time = get("last_traded_time")
+        tick.exch_feed_time = get("exch_feed_time")
+        tick.bid_size = get("bid_size")
+        tick.ask_size = get("ask_size")
+        tick.bid_price = get("bid_price")
+        tick.ask_price = get("ask_price")
+        tick.last_traded_qty = get("last_traded_qty")
+        tick.tot_buy_qty = get("tot_buy_qty")
+        tick.tot_sell_qty = get("tot_sell_qty")
+        tick.avg_trade_price = get("avg_trade_price")
+        tick.low_price = get("low_price")
+        tick.high_price = get("high_price")
+        tick.lower_ckt = get("lower_ckt")
+        tick.upper_ckt = get("upper_ckt")
+        tick.open_price = get("open_price")
+        tick.prev_close_price = get("prev_close_price")
+        tick.ch = get("ch")
+        tick.chp = get("chp")
+        return tick
+
+    def as_row(self):
+        """Field values in CSV column order."""
+        return [self.symbol, self.ltp, self.vol_traded_today, self.last_traded_time, self.exch_feed_time,
+                self.bid_size, self.ask_size, self.bid_price, self.ask_price, self.last_traded_qty,
+                self.tot_buy_qty, self.tot_sell_qty, self.avg_trade_price, self.low_price,
+                self.high_price, self.lower_ckt, self.upper_ckt, self.open_price, self.prev_close_price,
+                self.ch, self.chp]
+
+    def as_dict(self):
+        return dict(zip(TICK_FIELDS, self.as_row()))
+
+    def __repr__(self):
+        return f"Tick({self.symbol}, ltp={self.ltp}, exch_feed_time={self.exch_feed_time})"
+
+
+class TickDeduper:
+    """Drops repeated ticks, e.g. the replay the socket sends after a reconnect.
+
+    A tick is a duplicate when (exch_feed_time, vol_traded_today, ltp) matches
+    one of the last ``window`` ticks kept for its symbol.
+    """
+
+    def __init__(self, window=256):
+        self.window = window
+        self.recent = {}
+        self.duplicates = 0
+
+    def seen(self, tick):
+        key = (tick.exch_feed_time, tick.vol_traded_today, tick.ltp)
+        recent = self.recent.get(tick.symbol)
+        if recent is None:
+            recent = self.recent[tick.symbol] = ({}, [])
+        keys, order = recent
+        if key in keys:
+            self.duplicates += 1
+            return True
+        keys[key] = None
+        order.append(key)
+        if len(order) > self.window:
+            # Trim in chunks so the per-tick cost stays O(1) amortised.
+            for old in order[:self.window // 2]:
+                del keys[old]
+            del order[:self.window // 2]
+        return False
+
+
+DEPTH_LEVELS = 5
+# Book slots in DepthUpdate order: bid levels 1-5, then ask levels 1-5.
+DEPTH_KEYS = tuple((f"{side}_price{level}", f"{side}_size{level}", f"{side}_order{level}")
+                   for side in ("bid", "ask") for level in range(1, DEPTH_LEVELS + 1))
+
+
+class DepthUpdate:
+    """One DepthUpdate message: a (price, size, orders) tuple per book slot.
+
+    Fields the message left out are None, meaning "unchanged"; the depth sink
+    merges them into the book it keeps for the symbol.
+    """
+    __slots__ = ("symbol", "time", "levels")
+
+    @classmethod
+    def from_message(cls, message, received_at):
+        update = cls.__new__(cls)
+        get = message.get
+        update.symbol = get("symbol")
+        # Depth messages carry no exchange timestamp, so the receive time (microseconds) stands in.
+        update.time = int(received_at * 1_000_000)
+        update.levels = [(get(price), get(size), get(orders)) for price, size, orders in DEPTH_KEYS]
+        return update
+
+    def __repr__(self):
+        return f"DepthUpdate({self.symbol}, time={self.time})"
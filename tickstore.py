@@ -0,0 +1,202 @@
+import os
+import csv
+import sys
+import mmap
+import bisect
+import argparse
+from sinks import (BINARY_FIELDS, BINARY_HEADER, BINARY_INDEX, BINARY_MAGIC, BINARY_RECORD, DEPTH_HEADER,
+                   DEPTH_MAGIC, DEPTH_SNAPSHOT, FLOAT_FIELDS, INT_FIELDS, BinaryTickSink, DepthSink, depth_records,
+                   read_depth_index)
+from rollover import session_date
+from tick import Tick
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+if np is not None:
+    TICK_DTYPE = np.dtype([(field, "<i8") for field in BINARY_FIELDS[:len(INT_FIELDS)]]
+                          + [(field, "<f8") for field in FLOAT_FIELDS])
+    INDEX_DTYPE = np.dtype([("time", "<i8"), ("record", "<i8")])
+
+
+class TickStore:
+    """Range reads over the binary ``<SYMBOL>_data_<date>.ticks`` files written by BinaryTickSink.
+
+    ``read`` returns a slice of a read-only ``numpy.memmap``: no bytes are copied
+    until the caller touches them. Records are assumed to be in exch_feed_time
+    order, which is how the exchange feed delivers them per symbol.
+    """
+
+    def __init__(self, directory="."):
+        if np is None:
+            raise RuntimeError("TickStore requires numpy (pip install numpy)")
+        self.directory = directory
+        self.opened = {}
+
+    def path(self, symbol, date=None):
+        date = date or session_date()
+        return os.path.join(self.directory, f"{symbol[4:]}_data_{date}.{BinaryTickSink.extension}")
+
+    def open(self, path):
+        """Map a tick file and its sparse index; remapped when the file has grown."""
+        size = os.path.getsize(path)
+        cached = self.opened.get(path)
+        if cached and cached[0] == size:
+            return cached[1], cached[2]
+        with open(path, 'rb') as file:
+            magic, record_size, _, _ = BINARY_HEADER.unpack(file.read(BINARY_HEADER.size))
+        if magic != BINARY_MAGIC or record_size != BINARY_RECORD.size:
+            raise ValueError(f"{path} is not a tick file in this format")
+        count = (size - BINARY_HEADER.size) // BINARY_RECORD.size
+        if count:
+            records = np.memmap(path, dtype=TICK_DTYPE, mode='r', offset=BINARY_HEADER.size, shape=(count,))
+        else:
+            records = np.empty(0, dtype=TICK_DTYPE)
+        index_path = BinaryTickSink.index_path(path)
+        if os.path.exists(index_path):
+            entries = os.path.getsize(index_path) // BINARY_INDEX.size
+            index = np.fromfile(index_path, dtype=INDEX_DTYPE, count=entries)
+            index = index[index["record"] < count]
+        else:
+            index = np.empty(0, dtype=INDEX_DTYPE)
+        self.opened[path] = (size, records, index)
+        return records, index
+
+    def read(self, symbol, start, end, date=None):
+        """Ticks with start <= exch_feed_time <= end, as a zero-copy structured array view."""
+        return self.read_file(self.path(symbol, date), start, end)
+
+    def read_file(self, path, start, end):
+        records, index = self.open(path)
+        times = index["time"]
+        # Narrow to the index blocks that can hold the range, then bisect inside them.
+        first = np.searchsorted(times, start, side='left') - 1
+        low = int(index["record"][first]) if first >= 0 else 0
+        last = np.searchsorted(times, end, side='right')
+        high = int(index["record"][last]) if last < len(index) else len(records)
+        block = records[low:high]
+        feed_times = block["exch_feed_time"]
+        return block[np.searchsorted(feed_times, start, side='left'):np.searchsorted(feed_times, end, side='right')]
+
+
+class DepthReader:
+    """Rebuilds the order book of a DepthSink file at any point in time.
+
+    ``book_at`` bisects the snapshot index for the last snapshot at or before
+    the requested time and replays only the diffs after it, so a lookup never
+    reads more than one snapshot interval of the file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as file:
+            magic, self.levels, symbol = DEPTH_HEADER.unpack(file.read(DEPTH_HEADER.size))
+            if magic != DEPTH_MAGIC:
+                raise ValueError(f"{path} is not a depth file in this format")
+            self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.symbol = symbol.rstrip(b"\0").decode()
+        index = read_depth_index(DepthSink.index_path(path))
+        self.snapshot_times = [time_us for time_us, _ in index]
+        self.snapshot_offsets = [offset for _, offset in index]
+
+    def book_at(self, time_us):
+        """{"time", "bids", "asks"} as of ``time_us`` (epoch microseconds), or None before the first snapshot.
+
+        Diffs are only applied on top of a snapshot; an index entry that does not
+        point at one (e.g. an index from another run of the file) has the diffs
+        after it skipped up to the next snapshot, and a ValueError is raised if
+        there is none by ``time_us``.
+        """
+        i = bisect.bisect_right(self.snapshot_times, time_us) - 1
+        if i < 0:
+            return None
+        book = None
+        book_time = None
+        for kind, record_time, entries, _ in depth_records(self.data, self.snapshot_offsets[i]):
+            if record_time > time_us:
+                break
+            if kind == DEPTH_SNAPSHOT:
+                book = [None] * (2 * self.levels)
+            elif book is None:
+                continue
+            for slot, price, size, orders in entries:
+                book[slot] = (price, size, orders)
+            book_time = record_time
+        if book is None:
+            raise ValueError(f"{self.path}: no depth snapshot between offset {self.snapshot_offsets[i]} "
+                             f"and time {time_us}; the index does not match the file")
+        return {"time": book_time, "bids": book[:self.levels], "asks": book[self.levels:]}
+
+    def close(self):
+        self.data.close()
+
+
+def parse_number(value, kind):
+    if value is None or value == "":
+        return None
+    return int(float(value)) if kind is int else float(value)
+
+
+def convert_csv(csv_path, out_path=None):
+    """Rewrite a recorder CSV as a binary tick file; returns the number of ticks written."""
+    out_path = out_path or os.path.splitext(csv_path)[0] + "." + BinaryTickSink.extension
+    if os.path.exists(out_path):
+        raise FileExistsError(f"{out_path} already exists")
+    sink = BinaryTickSink(out_path)
+    count = 0
+    with open(csv_path, newline='') as file:
+        for row in csv.DictReader(file):
+            message = {"symbol": row.get("symbol")}
+            for field in INT_FIELDS:
+                message[field] = parse_number(row.get(field), int)
+            for field in FLOAT_FIELDS:
+                message[field] = parse_number(row.get(field), float)
+            sink.write(Tick.from_message(message))
+            count += 1
+            if sink.staged_bytes() >= 1024 * 1024:
+                sink.flush()
+    sink.close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Binary tick store utilities")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="Convert recorder CSVs to .ticks files")
+    convert.add_argument("files", nargs="+")
+    read = commands.add_parser("read", help="Print ticks of a .ticks file between two exch_feed_times")
+    read.add_argument("file")
+    read.add_argument("start", type=int)
+    read.add_argument("end", type=int)
+    book = commands.add_parser("book", help="Print the order book of a .depth file as of a point in time")
+    book.add_argument("file")
+    book.add_argument("time", type=float, help="Epoch seconds")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        for csv_path in args.files:
+            try:
+                print(f"Converted {convert_csv(csv_path)} ticks from {csv_path}")
+            except (OSError, ValueError) as e:
+                print(f"Error converting {csv_path}: {e}", file=sys.stderr)
+    elif args.command == "book":
+        reader = DepthReader(args.file)
+        state = reader.book_at(int(args.time * 1_000_000))
+        if state is None:
+            print(f"No snapshot of {reader.symbol} at or before {args.time}")
+            return
+        print(f"{reader.symbol} as of {state['time'] / 1_000_000:.6f}")
+        print(f"{'orders':>8}{'size':>10}{'bid':>12}  {'ask':<12}{'size':<10}{'orders':<8}")
+        for (bid, bid_size, bid_orders), (ask, ask_size, ask_orders) in zip(state["bids"], state["asks"]):
+            print(f"{bid_orders:>8}{bid_size:>10}{bid:>12.2f}  {ask:<12.2f}{ask_size:<10}{ask_orders:<8}")
+    else:
+        ticks = TickStore(os.path.dirname(args.file) or ".").read_file(args.file, args.start, args.end)
+        print(f"{len(ticks)} ticks")
+        for record in ticks:
+            print(record)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import json
+import asyncio
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+
+def decode(raw):
+    """A text frame holds one message dict or a JSON array of them."""
+    messages = json.loads(raw)
+    return messages if isinstance(messages, list) else [messages]
+
+
+class WebSocketFeed:
+    """Data socket for JSON-framed tick feeds that runs on the client's own event loop.
+
+    Has the interface of ``FyersDataSocket`` (same callbacks, ``subscribe`` /
+    ``unsubscribe`` / ``keep_running``), but reading the socket, decoding frames
+    and storing messages in the ingest ring all happen on the loop the ring's
+    consumer and the recorders run on, so a tick never changes threads between
+    the socket and the disk. When the ring is full the reader stops reading and
+    TCP pushes back on the sender instead of ticks being dropped. A frame that
+    is not valid JSON, or the elements of one that are not message dicts, are
+    skipped and counted in ``bad_frames``.
+
+    It does not speak the Fyers data socket protocol: it sends no access token
+    and only understands JSON text frames carrying the SDK's decoded message
+    dicts, which is what the stand-in server in replay.py sends (or a relay
+    that decodes the Fyers feed with the SDK could). Recording from Fyers
+    directly still goes through the SDK's threaded ``FyersDataSocket``.
+    Subscription requests go out as
+    ``{"type": "subscribe" | "unsubscribe", "symbols": [...], "data_type": ...}``.
+    """
+
+    def __init__(self, url, ring, on_connect=None, on_close=None, on_error=None,
+                 reconnect=True, reconnect_retry=10, loop=None):
+        if websockets is None:
+            raise RuntimeError("WebSocketFeed requires websockets (pip install websockets)")
+        self.url = url
+        self.ring = ring
+        self.on_connect = on_connect
+        self.on_close = on_close
+        self.on_error = on_error
+        self.reconnect = reconnect
+        self.reconnect_retry = reconnect_retry
+        self.loop = loop
+        self.websocket = None
+        self.closed = False
+        self.frames = 0
+        self.bad_frames = 0
+
+    def keep_running(self):
+        """The SDK's keep-alive; the client loop already keeps this socket running."""
+
+    def on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def subscribe(self, symbols, data_type="SymbolUpdate"):
+        self.request({"type": "subscribe", "symbols": list(symbols), "data_type": data_type})
+
+    def unsubscribe(self, symbols, data_type="SymbolUpdate"):
+        self.request({"type": "unsubscribe", "symbols": list(symbols), "data_type": data_type})
+
+    def request(self, message):
+        """Send a control message; callable from any thread (e.g. the subscription manager's)."""
+        if self.on_loop():
+            self.loop.create_task(self.send(message))
+        else:
+            asyncio.run_coroutine_threadsafe(self.send(message), self.loop)
+
+    async def send(self, message):
+        # While reconnecting requests are dropped; on_connect resubscribes the active set.
+        if self.websocket is None:
+            return
+        try:
+            await self.websocket.send(json.dumps(message))
+        except websockets.ConnectionClosed:
+            pass
+
+    async def run(self):
+        """Connect, read until closed and reconnect with backoff; returns once closed or out of retries."""
+        self.loop = asyncio.get_running_loop()
+        retries = 0
+        while not self.closed:
+            try:
+                async with websockets.connect(self.url, max_size=None) as websocket:
+                    self.websocket = websocket
+                    retries = 0
+                    if self.on_connect:
+                        self.on_connect()
+                    await self.read(websocket)
+                code, reason = websocket.close_code, websocket.close_reason
+            except (OSError, websockets.WebSocketException) as e:
+                code, reason = None, str(e)
+                if self.on_error:
+                    self.on_error(reason)
+            self.websocket = None
+            if self.on_close:
+                self.on_close({"code": code, "message": reason})
+            if self.closed or not self.reconnect or retries >= self.reconnect_retry:
+                break
+            retries += 1
+            await asyncio.sleep(min(30, 2 ** retries))
+
+    async def read(self, websocket):
+        ring = self.ring
+        put = ring.put
+        capacity = ring.capacity
+        async for raw in websocket:
+            self.frames += 1
+            try:
+                messages = decode(raw)
+            except ValueError as e:
+                self.skip_frame(f"undecodable frame: {e}")
+                continue
+            for message in messages:
+                if not isinstance(message, dict):
+                    self.skip_frame(f"non-message element {message!r:.80}")
+                    continue
+                if ring.depth() >= capacity:
+                    await ring.room()
+                put(message)
+            # A burst of buffered frames would not yield on its own; let the consumer drain.
+            if ring.depth() >= ring.max_batch:
+                await asyncio.sleep(0)
+
+    def skip_frame(self, reason):
+        self.bad_frames += 1
+        if self.bad_frames == 1:
+            print(f"Skipping {reason} (further ones are only counted)")
+
+    def close_connection(self):
+        """Stop reconnecting and close the socket; callable from any thread."""
+        self.closed = True
+        if self.loop is None or self.loop.is_closed():
+            return
+        if self.websocket is None:
+            return
+        if self.on_loop():
+            self.loop.create_task(self.websocket.close())
+        else:
+            asyncio.run_coroutine_threadsafe(self.websocket.close(), self.loop).result()